@@ -0,0 +1,130 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+# Sales analytics limits
+ANALYTICS_DEFAULT_DAYS = int(os.getenv('ANALYTICS_DEFAULT_DAYS', '30'))
+ANALYTICS_MAX_DAYS = int(os.getenv('ANALYTICS_MAX_DAYS', '731'))
+ANALYTICS_MAX_HOURLY_DAYS = int(os.getenv('ANALYTICS_MAX_HOURLY_DAYS', '31'))
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+class InvalidRange(ValueError):
+    """Raised when an analytics time range is empty or longer than allowed."""
+
+
+def utcnow():
+    """The current time as a naive UTC datetime, the form database sessions use."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _naive_utc(value):
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _floor(value, step):
+    value = _naive_utc(value).replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if step == DAY else value
+
+
+def _ceil(value, step):
+    floored = _floor(value, step)
+    return floored if floored == _naive_utc(value) else floored + step
+
+
+def resolve_range(start, end, interval="day"):
+    """Rounds ``[start, end)`` out to whole hours and applies the defaults and limits.
+
+    Without ``end`` the range runs to the end of today; without ``start`` it
+    covers the ``ANALYTICS_DEFAULT_DAYS`` before ``end``. Times are UTC, and
+    ones with an offset are converted.
+    """
+    end = _ceil(end, HOUR) if end else _floor(utcnow(), DAY) + DAY
+    start = _floor(start, HOUR) if start else end - ANALYTICS_DEFAULT_DAYS * DAY
+    if start >= end:
+        raise InvalidRange("start must be before end")
+    max_days = ANALYTICS_MAX_HOURLY_DAYS if interval == "hour" else ANALYTICS_MAX_DAYS
+    if end - start > max_days * DAY:
+        raise InvalidRange(f"Ranges are limited to {max_days} days at interval={interval}")
+    return start, end
+
+
+def plan_segments(start, end, interval="day"):
+    """Splits ``[start, end)`` into ``(grain, start, end)`` pieces, coarsest rollup first.
+
+    Whole days are read from the daily rollups and only the partial days at
+    either edge from the hourly ones, so a 90-day report scans about 90 rows
+    per product rather than 2160. Hourly intervals need the hourly rollup throughout.
+    """
+    if interval == "hour":
+        return [("hourly", start, end)]
+    first_day, last_day = _ceil(start, DAY), _floor(end, DAY)
+    if first_day >= last_day:
+        return [("hourly", start, end)]
+    segments = [("daily", first_day.date(), last_day.date())]
+    if start < first_day:
+        segments.insert(0, ("hourly", start, first_day))
+    if last_day < end:
+        segments.append(("hourly", last_day, end))
+    return segments
+
+
+def rollup_source(level, segments, filter_id=None):
+    """A ``UNION ALL`` of the ``level`` ("product" or "category") rollups covering ``segments``.
+
+    Returns ``(sql, params)``; the rows have ``bucket``, ``<level>_id``,
+    ``units`` and ``revenue`` columns.
+    """
+    parts, params = [], []
+    for grain, segment_start, segment_end in segments:
+        condition = "bucket >= %s AND bucket < %s"
+        params.extend([segment_start, segment_end])
+        if filter_id is not None:
+            condition += f" AND {level}_id = %s"
+            params.append(filter_id)
+        parts.append(f"SELECT bucket, {level}_id, units, revenue FROM sales_{level}_{grain} WHERE {condition}")
+    return " UNION ALL ".join(parts), params
+
+
+async def revenue_series(cursor, start, end, interval="day", category_id=None):
+    """Units and revenue per hour or day, optionally for one category."""
+    segments = plan_segments(start, end, interval)
+    source, params = rollup_source("category", segments, category_id)
+    bucket = "s.bucket" if interval == "hour" else "DATE(s.bucket)"
+    await cursor.execute(
+        f"SELECT {bucket} AS bucket, SUM(s.units) AS units, SUM(s.revenue) AS revenue "
+        f"FROM ({source}) s GROUP BY {bucket} ORDER BY {bucket}",
+        params,
+    )
+    return await cursor.fetchall()
+
+
+async def top_products(cursor, start, end, limit=10, by="revenue", category_id=None):
+    """The best-selling products in the range by ``revenue`` or ``units``."""
+    source, params = rollup_source("product", plan_segments(start, end))
+    where = ""
+    if category_id is not None:
+        where = "WHERE p.category_id = %s "
+        params.append(category_id)
+    await cursor.execute(
+        f"SELECT s.product_id, p.name, SUM(s.units) AS units, SUM(s.revenue) AS revenue "
+        f"FROM ({source}) s JOIN products p ON p.product_id = s.product_id {where}"
+        f"GROUP BY s.product_id, p.name HAVING SUM(s.units) > 0 "
+        f"ORDER BY SUM(s.{by}) DESC, s.product_id LIMIT %s",
+        (*params, limit),
+    )
+    return await cursor.fetchall()
+
+
+async def category_sales(cursor, start, end):
+    """Units and revenue per category in the range, highest revenue first."""
+    source, params = rollup_source("category", plan_segments(start, end))
+    await cursor.execute(
+        f"SELECT s.category_id, c.name, SUM(s.units) AS units, SUM(s.revenue) AS revenue "
+        f"FROM ({source}) s JOIN categories c ON c.category_id = s.category_id "
+        f"GROUP BY s.category_id, c.name HAVING SUM(s.units) > 0 "
+        f"ORDER BY SUM(s.revenue) DESC, s.category_id",
+        params,
+    )
+    return await cursor.fetchall()
@@ -0,0 +1,145 @@
+"""Rebuilds the sales rollup tables from the orders for a date range.
+
+The triggers in ecommerce_store.sql queue every order line for the rollups
+from the moment they are installed, and the API drains that queue; this fills
+them in for orders placed before that, or repairs a range after manual edits:
+
+    python backfill_rollups.py --start 2024-01-01 --end 2024-07-01 --days-per-batch 7
+
+Without ``--start``/``--end`` it covers every day with orders. The range is
+processed in windows of ``--days-per-batch`` whole days, one transaction each:
+the window's orders are share-locked, its queued lines and rollup rows
+deleted and then re-aggregated, so rerunning a window is harmless and concurrent checkouts or
+cancellations in it simply wait for that one transaction.
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import connect
+
+ROLLUP_TABLES = ("sales_product_hourly", "sales_product_daily", "sales_category_hourly", "sales_category_daily")
+
+# Run in order: the daily and category rollups are derived from the rebuilt product_hourly rows
+REBUILD_STATEMENTS = (
+    """
+    INSERT INTO sales_product_hourly (bucket, product_id, units, revenue)
+    SELECT DATE(o.order_date) + INTERVAL HOUR(o.order_date) HOUR, oi.product_id,
+           SUM(oi.quantity), SUM(oi.quantity * oi.unit_price)
+    FROM orders o JOIN order_items oi ON oi.order_id = o.order_id
+    WHERE o.order_date >= %s AND o.order_date < %s AND o.status <> 'cancelled'
+    GROUP BY 1, 2
+    """,
+    """
+    INSERT INTO sales_product_daily (bucket, product_id, units, revenue)
+    SELECT DATE(bucket), product_id, SUM(units), SUM(revenue)
+    FROM sales_product_hourly
+    WHERE bucket >= %s AND bucket < %s
+    GROUP BY 1, 2
+    """,
+    """
+    INSERT INTO sales_category_hourly (bucket, category_id, units, revenue)
+    SELECT s.bucket, p.category_id, SUM(s.units), SUM(s.revenue)
+    FROM sales_product_hourly s JOIN products p ON p.product_id = s.product_id
+    WHERE s.bucket >= %s AND s.bucket < %s
+    GROUP BY 1, 2
+    """,
+    """
+    INSERT INTO sales_category_daily (bucket, category_id, units, revenue)
+    SELECT DATE(bucket), category_id, SUM(units), SUM(revenue)
+    FROM sales_category_hourly
+    WHERE bucket >= %s AND bucket < %s
+    GROUP BY 1, 2
+    """,
+)
+
+
+def order_span(connection):
+    """The first day with orders and the day after the last one, or ``None`` when there are none."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT DATE(MIN(order_date)), DATE(MAX(order_date)) FROM orders")
+        first, last = cursor.fetchone()
+    finally:
+        cursor.close()
+    return None if first is None else (first, last + timedelta(days=1))
+
+
+def rebuild_window(connection, start, end):
+    """Re-aggregates the rollups for ``[start, end)`` in one transaction; returns the orders covered."""
+    cursor = connection.cursor()
+    try:
+        # Blocks new orders and status changes in the window until the rebuild commits
+        cursor.execute(
+            "SELECT order_id FROM orders WHERE order_date >= %s AND order_date < %s FOR SHARE",
+            (start, end),
+        )
+        orders = len(cursor.fetchall())
+        # Lines still queued for the window are covered by the rebuild, so draining them later would count them twice
+        cursor.execute("DELETE FROM sales_rollup_queue WHERE bucket >= %s AND bucket < %s", (start, end))
+        for table in ROLLUP_TABLES:
+            cursor.execute(f"DELETE FROM {table} WHERE bucket >= %s AND bucket < %s", (start, end))
+        for statement in REBUILD_STATEMENTS:
+            cursor.execute(statement, (start, end))
+        connection.commit()
+        return orders
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=date.fromisoformat, help="first day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="day after the last one to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--days-per-batch", type=int, default=1)
+    args = parser.parse_args()
+    if args.days_per_batch < 1:
+        parser.error("--days-per-batch must be at least 1")
+
+    connection = connect()
+    start, end = args.start, args.end
+    if start is None or end is None:
+        span = order_span(connection)
+        if span is None:
+            connection.close()
+            print("No orders to roll up", file=sys.stderr)
+            return 0
+        start, end = start or span[0], end or span[1]
+    if start >= end:
+        connection.close()
+        parser.error("--start must be before --end")
+
+    began = time.perf_counter()
+    windows = orders = 0
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + timedelta(days=args.days_per_batch), end)
+        started = time.perf_counter()
+        count = rebuild_window(connection, window_start, window_end)
+        windows += 1
+        orders += count
+        print(f"✅ {window_start} to {window_end}: {count} orders in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+        window_start = window_end
+    connection.close()
+
+    print(json.dumps({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "windows": windows,
+        "orders": orders,
+        "elapsed_seconds": round(time.perf_counter() - began, 3),
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import os
+
+# Upper bound on IDs per batch request; keeps the IN list and the response a sensible size
+BATCH_MAX_IDS = int(os.getenv('BATCH_MAX_IDS', '200'))
+
+
+class InvalidBatch(ValueError):
+    """Raised when a batch request's ID list is malformed, empty or too long."""
+
+
+def parse_ids(text):
+    """Parses a comma-separated ``ids`` parameter, dropping repeats but keeping order."""
+    try:
+        ids = [int(part) for part in text.split(",") if part.strip()]
+    except ValueError:
+        raise InvalidBatch("ids must be a comma-separated list of integers")
+    return check_ids(ids)
+
+
+def check_ids(ids):
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise InvalidBatch("At least one id is required")
+    if len(ids) > BATCH_MAX_IDS:
+        raise InvalidBatch(f"At most {BATCH_MAX_IDS} ids can be fetched at once")
+    return ids
+
+
+async def fetch_by_ids(cursor, table, id_column, ids, columns="*"):
+    """Fetches the rows of ``table`` whose ``id_column`` is in ``ids`` with one query.
+
+    Returns a dict keyed by id; IDs with no row are simply absent.
+    """
+    placeholders = ", ".join(["%s"] * len(ids))
+    await cursor.execute(f"SELECT {columns} FROM {table} WHERE {id_column} IN ({placeholders})", tuple(ids))
+    return {row[id_column]: row for row in await cursor.fetchall()}
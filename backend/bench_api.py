@@ -0,0 +1,337 @@
+"""Load generator and benchmark harness for the users, products and categories endpoints.
+
+Seeds a synthetic catalog into the database from ``.env``, drives a running
+API with a weighted read/write mix from ``--concurrency`` workers for
+``--duration`` seconds, and writes latency percentiles, throughput and database
+round-trips per request to a JSON file so runs can be diffed:
+
+    python bench_api.py --users 1000 --categories 50 --products 100000 \\
+        --concurrency 32 --duration 30 --output results.json
+
+Round-trips per request come from the ``X-DB-Queries`` header, so start the
+API with ``DB_QUERY_COUNT_HEADER=true`` to get them. The seeded rows, and
+the products the run creates, are removed afterwards unless ``--keep`` is
+given, also when seeding or the run fails.
+"""
+import argparse
+import http.client
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import connect
+
+DEFAULT_MIX = (
+    "get_product=30,list_products=25,list_categories=10,get_user=10,list_users=5,"
+    "update_product=8,create_product=5,update_user=5,update_category=2"
+)
+
+SEED_BATCH_SIZE = 1000
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"Unknown operation '{name.strip()}'; choose from {', '.join(OPERATIONS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# Seeding
+
+def seed(connection, run, users, categories, products):
+    cursor = connection.cursor()
+    try:
+        # A shallow tree: the first tenth of the categories are roots, the rest hang under them
+        category_ids = []
+        roots = max(1, categories // 10)
+        for i in range(categories):
+            parent = random.choice(category_ids[:roots]) if i >= roots else None
+            cursor.execute(
+                "INSERT INTO categories (name, description, parent_category_id) VALUES (%s, %s, %s)",
+                (f"bench-{run}-{i}", "Benchmark category", parent),
+            )
+            category_id = cursor.lastrowid
+            category_ids.append(category_id)
+            # Same closure rows create_category writes
+            cursor.execute(
+                "INSERT INTO category_closure (ancestor_id, descendant_id, depth) "
+                "SELECT ancestor_id, %s, depth + 1 FROM category_closure WHERE descendant_id = %s "
+                "UNION ALL SELECT %s, %s, 0",
+                (category_id, parent, category_id, category_id),
+            )
+        connection.commit()
+
+        words = ["red", "blue", "steel", "cotton", "classic", "compact", "wireless", "organic", "deluxe", "travel"]
+        for start in range(0, products, SEED_BATCH_SIZE):
+            cursor.executemany(
+                "INSERT INTO products (name, description, price, stock_quantity, category_id) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [
+                    (
+                        f"bench-{run} {' '.join(random.sample(words, 2))} {i}",
+                        " ".join(random.choices(words, k=8)),
+                        round(random.uniform(1, 500), 2),
+                        random.randint(0, 1000),
+                        random.choice(category_ids),
+                    )
+                    for i in range(start, min(products, start + SEED_BATCH_SIZE))
+                ],
+            )
+            connection.commit()
+
+        for start in range(0, users, SEED_BATCH_SIZE):
+            cursor.executemany(
+                "INSERT INTO users (email, password_hash, first_name, last_name) VALUES (%s, %s, %s, %s)",
+                [
+                    (f"bench-{run}-{i}@example.invalid", "-", "Bench", str(i))
+                    for i in range(start, min(users, start + SEED_BATCH_SIZE))
+                ],
+            )
+            connection.commit()
+
+        cursor.execute("SELECT product_id FROM products WHERE name LIKE %s", (f"bench-{run} %",))
+        product_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT user_id FROM users WHERE email LIKE %s", (f"bench-{run}-%",))
+        user_ids = [row[0] for row in cursor.fetchall()]
+        connection.commit()
+        return {"category_ids": category_ids, "product_ids": product_ids, "user_ids": user_ids}
+    finally:
+        cursor.close()
+
+
+def cleanup(connection, run):
+    """Deletes the run's rows by their name prefix, so it also works after a failed seed."""
+    # Drops whatever a failed step left uncommitted
+    connection.rollback()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("DELETE FROM users WHERE email LIKE %s", (f"bench-{run}-%",))
+        # Seeded products and those created during the run share the prefix
+        cursor.execute("DELETE FROM products WHERE name LIKE %s", (f"bench-{run} %",))
+        # Children before parents, since they were inserted after them
+        cursor.execute(
+            "SELECT category_id FROM categories WHERE name LIKE %s ORDER BY category_id DESC", (f"bench-{run}-%",)
+        )
+        for (category_id,) in cursor.fetchall():
+            cursor.execute("DELETE FROM categories WHERE category_id = %s", (category_id,))
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+# Operations: each returns (method, path, body)
+
+def op_get_product(catalog, rng):
+    return "GET", f"/products/{rng.choice(catalog['product_ids'])}", None
+
+
+def op_list_products(catalog, rng):
+    if rng.random() < 0.5:
+        return "GET", f"/products/?limit=20&skip={rng.randint(0, 500)}", None
+    return "GET", f"/products/?limit=20&category_id={rng.choice(catalog['category_ids'])}", None
+
+
+def op_list_categories(catalog, rng):
+    return "GET", "/categories/", None
+
+
+def op_get_user(catalog, rng):
+    return "GET", f"/users/{rng.choice(catalog['user_ids'])}", None
+
+
+def op_list_users(catalog, rng):
+    return "GET", f"/users/?limit=20&skip={rng.randint(0, 500)}", None
+
+
+def op_update_product(catalog, rng):
+    body = {"price": round(rng.uniform(1, 500), 2), "stock_quantity": rng.randint(0, 1000)}
+    return "PUT", f"/products/{rng.choice(catalog['product_ids'])}", body
+
+
+def op_create_product(catalog, rng):
+    body = {
+        "name": f"bench-{catalog['run']} new {rng.randint(0, 10**9)}",
+        "price": round(rng.uniform(1, 500), 2),
+        "stock_quantity": rng.randint(0, 1000),
+        "category_id": rng.choice(catalog["category_ids"]),
+    }
+    return "POST", "/products/", body
+
+
+def op_update_user(catalog, rng):
+    return "PUT", f"/users/{rng.choice(catalog['user_ids'])}", {"phone_number": str(rng.randint(10**9, 10**10))}
+
+
+def op_update_category(catalog, rng):
+    return "PUT", f"/categories/{rng.choice(catalog['category_ids'])}", {"description": f"rev {rng.randint(0, 10**6)}"}
+
+
+OPERATIONS = {
+    "get_product": op_get_product,
+    "list_products": op_list_products,
+    "list_categories": op_list_categories,
+    "get_user": op_get_user,
+    "list_users": op_list_users,
+    "update_product": op_update_product,
+    "create_product": op_create_product,
+    "update_user": op_update_user,
+    "update_category": op_update_category,
+}
+
+
+# Load generation
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, name, seconds, ok, queries):
+        with self.lock:
+            self.samples.setdefault(name, []).append((seconds, ok, queries))
+
+
+def worker(base_url, catalog, mix, seed_value, deadline, measure_from, recorder):
+    rng = random.Random(seed_value)
+    names, weights = list(mix), list(mix.values())
+    url = urlsplit(base_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    try:
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            method, path, body = OPERATIONS[name](catalog, rng)
+            payload = json.dumps(body).encode() if body is not None else None
+            headers = {"Content-Type": "application/json"} if payload else {}
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 400
+                queries = response.getheader("X-DB-Queries")
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok, queries = False, None
+            finished = time.perf_counter()
+            if started >= measure_from:
+                recorder.add(name, finished - started, ok, int(queries) if queries is not None else None)
+    finally:
+        connection.close()
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(s for s, _, _ in samples)
+    queries = [q for _, _, q in samples if q is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, ok, _ in samples if not ok),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 3) if latencies else None,
+        "p50_ms": round(1000 * percentile(latencies, 0.50), 3) if latencies else None,
+        "p95_ms": round(1000 * percentile(latencies, 0.95), 3) if latencies else None,
+        "p99_ms": round(1000 * percentile(latencies, 0.99), 3) if latencies else None,
+        "max_ms": round(1000 * latencies[-1], 3) if latencies else None,
+        "db_queries_per_request": round(sum(queries) / len(queries), 3) if queries else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated operation=weight pairs")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the catalog and the request mix")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--keep", action="store_true", help="leave the seeded rows in place")
+    args = parser.parse_args()
+    # Products and several operations pick a seeded category
+    if args.categories < 1:
+        parser.error("--categories must be at least 1")
+
+    mix = parse_mix(args.mix)
+    random.seed(args.seed)
+    run = uuid.uuid4().hex[:8]
+
+    connection = connect()
+    try:
+        seed_started = time.perf_counter()
+        catalog = seed(connection, run, args.users, args.categories, args.products)
+        catalog["run"] = run
+        seed_seconds = time.perf_counter() - seed_started
+
+        recorder = Recorder()
+        measure_from = time.perf_counter() + args.warmup
+        deadline = measure_from + args.duration
+        threads = [
+            threading.Thread(
+                target=worker,
+                args=(args.base_url, catalog, mix, args.seed * 1000 + i, deadline, measure_from, recorder),
+            )
+            for i in range(args.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        all_samples = [sample for samples in recorder.samples.values() for sample in samples]
+        results = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "config": {
+                "base_url": args.base_url,
+                "users": args.users,
+                "categories": args.categories,
+                "products": args.products,
+                "concurrency": args.concurrency,
+                "duration_seconds": args.duration,
+                "warmup_seconds": args.warmup,
+                "mix": mix,
+                "seed": args.seed,
+            },
+            "seed_seconds": round(seed_seconds, 3),
+            "overall": summarize(all_samples, args.duration),
+            "endpoints": {
+                name: summarize(recorder.samples[name], args.duration) for name in sorted(recorder.samples)
+            },
+        }
+    finally:
+        # Also after a failed seed or an interrupted run
+        if not args.keep:
+            cleanup(connection, run)
+        connection.close()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["overall"], indent=2))
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
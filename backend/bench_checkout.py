@@ -0,0 +1,192 @@
+"""Concurrency benchmark for POST /users/{id}/checkout.
+
+Seeds one product with ``--stock`` units and ``--buyers`` users who each hold
+``--quantity`` of it in their cart, fires every checkout at once against a
+running API, then checks the database for oversell:
+
+    python bench_checkout.py --base-url http://localhost:8000 --stock 100 --buyers 500
+
+Prints a JSON summary and exits non-zero if the stock count is inconsistent.
+Seeded rows are removed afterwards unless ``--keep`` is given.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import connect
+
+
+def seed(connection, run, stock, buyers, quantity):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("INSERT INTO categories (name) VALUES (%s)", (f"bench-{run}",))
+        category_id = cursor.lastrowid
+        cursor.execute(
+            "INSERT INTO products (name, price, stock_quantity, category_id) VALUES (%s, %s, %s, %s)",
+            (f"bench-{run}", 9.99, stock, category_id),
+        )
+        product_id = cursor.lastrowid
+
+        cursor.executemany(
+            "INSERT INTO users (email, password_hash, first_name, last_name) VALUES (%s, %s, %s, %s)",
+            [(f"bench-{run}-{i}@example.invalid", "-", "Bench", str(i)) for i in range(buyers)],
+        )
+        cursor.execute("SELECT user_id FROM users WHERE email LIKE %s ORDER BY user_id", (f"bench-{run}-%",))
+        user_ids = [row[0] for row in cursor.fetchall()]
+
+        cursor.executemany(
+            "INSERT INTO addresses (user_id, street_address, city, state, zip_code, country) "
+            "VALUES (%s, '1 Bench St', 'Bench', 'BN', '00000', 'XX')",
+            [(user_id,) for user_id in user_ids],
+        )
+        cursor.execute(
+            "SELECT user_id, address_id FROM addresses WHERE user_id IN (%s)" % ", ".join(["%s"] * len(user_ids)),
+            user_ids,
+        )
+        addresses = dict(cursor.fetchall())
+
+        cursor.executemany(
+            "INSERT INTO cart_items (user_id, product_id, quantity) VALUES (%s, %s, %s)",
+            [(user_id, product_id, quantity) for user_id in user_ids],
+        )
+        connection.commit()
+        return category_id, product_id, addresses
+    finally:
+        cursor.close()
+
+
+def verify(connection, product_id, user_ids):
+    cursor = connection.cursor()
+    try:
+        connection.commit()  # start a fresh snapshot
+        cursor.execute("SELECT stock_quantity FROM products WHERE product_id = %s", (product_id,))
+        final_stock = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT COALESCE(SUM(quantity), 0), COUNT(DISTINCT order_id) FROM order_items WHERE product_id = %s",
+            (product_id,),
+        )
+        sold, orders = cursor.fetchone()
+        cursor.execute(
+            "SELECT COUNT(*) FROM cart_items WHERE user_id IN (%s)" % ", ".join(["%s"] * len(user_ids)),
+            user_ids,
+        )
+        carts_left = cursor.fetchone()[0]
+        return int(final_stock), int(sold), int(orders), int(carts_left)
+    finally:
+        cursor.close()
+
+
+def cleanup(connection, category_id, product_id, user_ids):
+    cursor = connection.cursor()
+    try:
+        in_users = ", ".join(["%s"] * len(user_ids))
+        cursor.execute(
+            f"DELETE p FROM payments p JOIN orders o ON o.order_id = p.order_id WHERE o.user_id IN ({in_users})",
+            user_ids,
+        )
+        cursor.execute(f"DELETE FROM orders WHERE user_id IN ({in_users})", user_ids)
+        cursor.execute(f"DELETE FROM users WHERE user_id IN ({in_users})", user_ids)
+        cursor.execute("DELETE FROM products WHERE product_id = %s", (product_id,))
+        cursor.execute("DELETE FROM categories WHERE category_id = %s", (category_id,))
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def post_checkout(base_url, user_id, address_id, start, timeout):
+    body = json.dumps({"shipping_address_id": address_id, "payment_method": "bench"}).encode()
+    request = urllib.request.Request(
+        f"{base_url}/users/{user_id}/checkout", data=body, headers={"Content-Type": "application/json"}
+    )
+    start.wait()
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            code = response.status
+    except urllib.error.HTTPError as e:
+        code = e.code
+    except OSError:
+        code = 0
+    return code, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--stock", type=int, default=100)
+    parser.add_argument("--buyers", type=int, default=300)
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--keep", action="store_true", help="leave the seeded rows in place")
+    args = parser.parse_args()
+
+    run = uuid.uuid4().hex[:8]
+    connection = connect()
+    category_id, product_id, addresses = seed(connection, run, args.stock, args.buyers, args.quantity)
+    user_ids = sorted(addresses)
+
+    # Every thread blocks on the event so the checkouts hit the API together
+    start = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(user_ids)) as pool:
+        futures = [
+            pool.submit(post_checkout, args.base_url, user_id, addresses[user_id], start, args.timeout)
+            for user_id in user_ids
+        ]
+        began = time.perf_counter()
+        start.set()
+        results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - began
+
+    final_stock, sold, orders, carts_left = verify(connection, product_id, user_ids)
+    codes = {}
+    for code, _ in results:
+        codes[str(code)] = codes.get(str(code), 0) + 1
+    latencies = sorted(seconds for _, seconds in results)
+    accepted = codes.get("201", 0)
+    expected_accepted = min(args.buyers, args.stock // args.quantity)
+
+    checks = {
+        "no_oversell": final_stock >= 0,
+        "stock_matches_sold": final_stock == args.stock - sold,
+        "orders_match_accepted": orders == accepted and sold == accepted * args.quantity,
+        "all_stock_sold_or_all_served": accepted == expected_accepted,
+        "carts_cleared_for_accepted": carts_left == len(user_ids) - accepted,
+    }
+    summary = {
+        "buyers": args.buyers,
+        "initial_stock": args.stock,
+        "quantity": args.quantity,
+        "status_codes": codes,
+        "final_stock": final_stock,
+        "sold": sold,
+        "orders": orders,
+        "elapsed_seconds": round(elapsed, 3),
+        "checkouts_per_second": round(len(results) / elapsed, 1) if elapsed else None,
+        "latency_seconds": {
+            "p50": round(latencies[len(latencies) // 2], 4),
+            "max": round(latencies[-1], 4),
+        },
+        "checks": checks,
+        "passed": all(checks.values()),
+    }
+
+    if not args.keep:
+        cleanup(connection, category_id, product_id, user_ids)
+    connection.close()
+
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
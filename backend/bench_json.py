@@ -0,0 +1,129 @@
+"""Compares the default response path with the FAST_JSON path for list endpoints.
+
+Builds synthetic product and user rows shaped like driver output (Decimal
+prices, datetimes, None, non-ASCII and control characters) and times:
+
+- default: FastAPI validating against ``List[ProductResponse]`` / ``List[UserResponse]``
+  and encoding with Starlette's JSONResponse
+- fast: projecting rows onto the model fields and encoding with orjson (or the
+  stdlib fallback when orjson is not installed)
+
+It checks that both produce identical bytes and prints the timings as JSON:
+
+    python bench_json.py --rows 500 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import fastjson
+from main import ProductResponse, UserResponse
+
+SAMPLE_TEXT = ["Plain", "Ünïcödé ✓", "emoji 🎧", 'quote " and \\ backslash', "tab\tnew\nline\x01", "</script>", ""]
+
+
+def product_rows(count, rng):
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        {
+            "product_id": i,
+            "name": f"{rng.choice(SAMPLE_TEXT)} product {i}",
+            "description": rng.choice(SAMPLE_TEXT + [None]),
+            "price": Decimal(rng.randint(1, 9999999999)) / 100,
+            "stock_quantity": rng.randint(0, 10000),
+            "category_id": rng.randint(1, 50),
+            "image_url": rng.choice([None, f"https://cdn.example.com/p/{i}.jpg"]),
+            "created_at": base + timedelta(seconds=rng.randint(0, 10**8)),
+            "updated_at": base + timedelta(seconds=rng.randint(0, 10**8), microseconds=rng.choice([0, 123456])),
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def user_rows(count, rng):
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        {
+            "user_id": i,
+            "email": f"user{i}@example.com",
+            "password_hash": "$2b$12$" + "x" * 53,
+            "first_name": rng.choice(SAMPLE_TEXT),
+            "last_name": f"Last{i}",
+            "phone_number": rng.choice([None, "+1 555 0100"]),
+            "created_at": base + timedelta(seconds=rng.randint(0, 10**8)),
+            "updated_at": base + timedelta(seconds=rng.randint(0, 10**8)),
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+async def default_path(field, rows):
+    content = await serialize_response(field=field, response_content=rows)
+    return JSONResponse(content).body
+
+
+def fast_path(model, rows):
+    return fastjson.dumps(fastjson.rows_jsonable(rows, model))
+
+
+def time_it(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {"median_ms": round(1000 * timings[len(timings) // 2], 3), "min_ms": round(1000 * timings[0], 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fastjson.FAST_JSON = True
+    loop = asyncio.new_event_loop()
+    results = {"rows": args.rows, "encoder": "orjson" if fastjson.orjson is not None else "json", "endpoints": {}}
+    identical = True
+
+    for name, model, rows in (
+        ("products", ProductResponse, product_rows(args.rows, rng)),
+        ("users", UserResponse, user_rows(args.rows, rng)),
+    ):
+        field = create_response_field(name="response", type_=List[model])
+        default_bytes = loop.run_until_complete(default_path(field, rows))
+        fast_bytes = fast_path(model, rows)
+        same = default_bytes == fast_bytes
+        identical = identical and same
+
+        default_timing = time_it(lambda: loop.run_until_complete(default_path(field, rows)), args.repeat)
+        fast_timing = time_it(lambda: fast_path(model, rows), args.repeat)
+        results["endpoints"][name] = {
+            "identical_bytes": same,
+            "bytes": len(default_bytes),
+            "default": default_timing,
+            "fast": fast_timing,
+            "speedup": round(default_timing["median_ms"] / fast_timing["median_ms"], 2),
+        }
+
+    loop.close()
+    results["identical_bytes"] = identical
+    print(json.dumps(results, indent=2))
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import asyncio
+import csv
+import json
+import os
+import random
+
+from pydantic import ValidationError
+
+from database import DatabaseError, ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+
+# Bulk import configuration
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '1000'))
+BULK_MAX_ERRORS = int(os.getenv('BULK_MAX_ERRORS', '1000'))
+BULK_MAX_RETRIES = int(os.getenv('BULK_MAX_RETRIES', '5'))
+BULK_RETRY_BACKOFF = float(os.getenv('BULK_RETRY_BACKOFF', '0.05'))
+
+# These roll back the whole transaction, not just the failing statement
+_RETRYABLE = (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT)
+
+UPSERT_PRODUCTS_QUERY = """
+    INSERT INTO products (product_id, name, description, price, stock_quantity, category_id, image_url)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        name = VALUES(name),
+        description = VALUES(description),
+        price = VALUES(price),
+        stock_quantity = VALUES(stock_quantity),
+        category_id = VALUES(category_id),
+        image_url = VALUES(image_url)
+"""
+
+
+async def iter_lines(stream):
+    """Splits an async byte stream into decoded lines without buffering the whole body."""
+    pending = b""
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8").rstrip("\r")
+
+
+async def iter_ndjson(stream):
+    """Yields ``(row_number, record_or_error)`` for each non-blank NDJSON line."""
+    row_number = 0
+    async for line in iter_lines(stream):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+            yield row_number, record
+        except ValueError as e:
+            yield row_number, ValueError(f"Invalid JSON: {str(e)}")
+
+
+async def iter_csv(stream):
+    """Yields ``(row_number, record_or_error)`` for each CSV data row; the first row is the header."""
+    header = None
+    row_number = 0
+    record_lines = []
+    async for line in iter_lines(stream):
+        # A quoted field may span lines; a record is complete once its quotes balance
+        record_lines.append(line)
+        text = "\n".join(record_lines)
+        if text.count('"') % 2:
+            continue
+        record_lines = []
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        # Empty CSV cells mean "not provided"
+        yield row_number, {name: value for name, value in zip(header, values) if value != ""}
+    if record_lines:
+        yield row_number + 1, ValueError("Unterminated quoted field")
+
+
+class ImportReport:
+    def __init__(self, max_errors=BULK_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.received = 0
+        self.written = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number, error):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "error": error})
+
+    def as_dict(self):
+        return {
+            "received": self.received,
+            "written": self.written,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+async def import_products(connection, records, row_model, updated_ids, batch_size=BULK_BATCH_SIZE):
+    """Validates and upserts product records in batches and returns an :class:`ImportReport`.
+
+    Each batch is written with one ``executemany`` in its own transaction. If a
+    batch fails, it is replayed row by row so only the offending rows are reported;
+    on deadlock or lock wait timeout the whole batch is retried instead.
+    IDs of rows that target an existing ``product_id`` are appended to ``updated_ids``
+    as they are read, so callers can invalidate caches even if the import fails midway.
+    """
+    report = ImportReport()
+    cursor = await connection.cursor()
+    try:
+        # One lookup up front instead of a category SELECT per row
+        await cursor.execute("SELECT category_id FROM categories")
+        category_ids = {row[0] for row in await cursor.fetchall()}
+        await connection.commit()
+
+        batch = []
+        async for row_number, record in records:
+            report.received += 1
+            if isinstance(record, Exception):
+                report.add_error(row_number, str(record))
+                continue
+            try:
+                product = row_model(**record)
+            except ValidationError as e:
+                report.add_error(row_number, "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                ))
+                continue
+            if product.category_id not in category_ids:
+                report.add_error(row_number, f"Category with ID {product.category_id} does not exist")
+                continue
+
+            if product.product_id is not None:
+                updated_ids.append(product.product_id)
+            batch.append((row_number, (
+                product.product_id, product.name, product.description, product.price,
+                product.stock_quantity, product.category_id, product.image_url
+            )))
+            if len(batch) >= batch_size:
+                await _write_batch(connection, cursor, batch, report)
+                batch = []
+
+        if batch:
+            await _write_batch(connection, cursor, batch, report)
+    finally:
+        await cursor.close()
+
+    return report
+
+
+async def _write_batch(connection, cursor, batch, report):
+    """Writes one batch, retrying it from the start on deadlock or lock wait timeout.
+
+    Raises :class:`DatabaseError` once retries are exhausted.
+    """
+    attempt = 0
+    while True:
+        try:
+            written, errors = await _write_batch_once(connection, cursor, batch)
+            break
+        except DatabaseError as e:
+            await connection.rollback()
+            if e.errno not in _RETRYABLE or attempt >= BULK_MAX_RETRIES:
+                raise
+            attempt += 1
+            print(f"❌ Bulk batch hit lock error {e.errno}, retry {attempt}/{BULK_MAX_RETRIES}")
+            # Jittered exponential backoff so the colliding transactions don't meet again
+            await asyncio.sleep(BULK_RETRY_BACKOFF * (2 ** attempt) * random.random())
+    # Counted only once committed, so a retried attempt is never reported twice
+    report.written += written
+    for row_number, error in errors:
+        report.add_error(row_number, error)
+
+
+async def _write_batch_once(connection, cursor, batch):
+    """Returns ``(rows written, [(row_number, error), ...])`` once the batch has committed."""
+    try:
+        await cursor.executemany(UPSERT_PRODUCTS_QUERY, [params for _, params in batch])
+        await connection.commit()
+        return len(batch), []
+    except DatabaseError as e:
+        if e.errno in _RETRYABLE:
+            raise
+        await connection.rollback()
+        print(f"❌ Bulk batch failed, retrying row by row: {str(e)}")
+
+    # MySQL rolls back only the failing statement, so good rows still commit together
+    written, errors = 0, []
+    for row_number, params in batch:
+        try:
+            await cursor.execute(UPSERT_PRODUCTS_QUERY, params)
+            written += 1
+        except DatabaseError as e:
+            if e.errno in _RETRYABLE:
+                # The rows written so far were rolled back with the transaction
+                raise
+            errors.append((row_number, f"Database error: {str(e)}"))
+    await connection.commit()
+    return written, errors
@@ -0,0 +1,534 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+# Read cache configuration
+CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv('CACHE_TTL', '60'))
+CACHE_CATEGORY_TTL = float(os.getenv('CACHE_CATEGORY_TTL', '300'))
+
+# Shared (L2) backend: "memory" keeps everything in-process, "redis" adds a Redis-protocol L2
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory').lower()
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+CACHE_NAMESPACE = os.getenv('CACHE_NAMESPACE', 'ecommerce:cache')
+CACHE_L1_MAX_BYTES = int(os.getenv('CACHE_L1_MAX_BYTES', str(8 * 1024 * 1024)))
+CACHE_L1_TTL = float(os.getenv('CACHE_L1_TTL', '5'))
+
+# Invalidation counters only have to outlive the loads in flight when they are bumped
+_VERSION_TTL = 3600
+
+
+def _estimate_size(value):
+    # Values are JSON-compatible, so their encoded length is a cheap, stable size estimate
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+
+class ReadThroughCache:
+    """In-process TTL + LRU cache for JSON-compatible values.
+
+    Entries expire after their TTL and the least recently used ones are evicted
+    once the estimated size exceeds ``max_bytes``. Entries may belong to a
+    ``group`` (e.g. all product list pages) that is invalidated as a whole.
+    :meth:`get_or_load` coalesces concurrent misses so a cold key triggers a
+    single load, and a load that races with an invalidation of its key is
+    returned but not stored.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, default_ttl=CACHE_TTL, enabled=CACHE_ENABLED):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+
+        self._entries = OrderedDict()  # key -> (value, expires_at, size, group)
+        self._groups = {}  # group -> set of keys
+        self._bytes = 0
+        self._inflight = {}  # key -> (load task or future shared by coalesced callers, group)
+        self._stale_loads = set()  # load tasks whose key was invalidated mid-flight
+        self._listeners = []  # callbacks run on every invalidation
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Returns ``(True, value)`` on a fresh hit, ``(False, None)`` otherwise."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at, size, group = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key, value, ttl=None, group=None):
+        if not self.enabled:
+            return
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + (ttl or self.default_ttl), size, group)
+        if group is not None:
+            self._groups.setdefault(group, set()).add(key)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def get_or_load(self, key, loader, ttl=None, group=None):
+        """Returns the cached value for ``key`` or awaits ``loader()`` once for all concurrent callers.
+
+        ``None`` results are passed through but never cached.
+        """
+        if not self.enabled:
+            return await loader()
+
+        hit, value = self.get(key)
+        if hit:
+            self.hits += 1
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending[0])
+
+        self.misses += 1
+        # The load runs as its own task so a cancelled caller doesn't fail the coalesced ones
+        task = asyncio.ensure_future(self._load(key, loader, ttl, group))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = (task, group)
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader, ttl, group):
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+        finally:
+            stale = self._finish_load(key, task)
+        if value is not None and not stale:
+            self.set(key, value, ttl, group)
+        return value
+
+    async def get_many_or_load(self, keys, loader, ttl=None, group=None):
+        """Batch form of :meth:`get_or_load`: returns a dict with a value for every key.
+
+        Keys that are neither cached nor already loading are passed together to a
+        single ``await loader(missing)``, which returns a dict of the values it
+        found; keys it leaves out come back as ``None``. Concurrent callers of
+        either method share the per-key loads.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not self.enabled:
+            loaded = await loader(keys)
+            return {key: loaded.get(key) for key in keys}
+
+        values, waiting, missing = {}, {}, []
+        for key in keys:
+            hit, value = self.get(key)
+            if hit:
+                self.hits += 1
+                values[key] = value
+            elif key in self._inflight:
+                self.coalesced += 1
+                waiting[key] = self._inflight[key][0]
+            else:
+                self.misses += 1
+                missing.append(key)
+
+        if missing:
+            # One future per key so single-key callers can coalesce onto the batch load
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in missing}
+            for key, future in futures.items():
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._inflight[key] = (future, group)
+            task = asyncio.ensure_future(self._load_many(futures, loader, ttl, group))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            waiting.update(futures)
+
+        for key, pending in waiting.items():
+            values[key] = await asyncio.shield(pending)
+        return {key: values[key] for key in keys}
+
+    async def _load_many(self, futures, loader, ttl, group):
+        try:
+            loaded = await loader(list(futures))
+        except BaseException as e:
+            for key, future in futures.items():
+                self._finish_load(key, future)
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+            raise
+        for key, future in futures.items():
+            value = loaded.get(key)
+            stale = self._finish_load(key, future)
+            if value is not None and not stale:
+                self.set(key, value, ttl, group)
+            future.set_result(value)
+
+    def _finish_load(self, key, pending):
+        """Unregisters a finished load and reports whether its key was invalidated meanwhile."""
+        if self._inflight.get(key, (None,))[0] is pending:
+            del self._inflight[key]
+        stale = pending in self._stale_loads
+        self._stale_loads.discard(pending)
+        return stale
+
+    async def invalidate(self, *keys):
+        self._invalidate_local(keys)
+
+    async def invalidate_group(self, group):
+        self._invalidate_group_local(group)
+
+    async def clear(self):
+        self._clear_local()
+
+    def on_invalidate(self, callback):
+        """Registers ``callback()`` to run whenever entries are invalidated, here or by another worker."""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            callback()
+
+    def _invalidate_local(self, keys):
+        self._notify()
+        for key in keys:
+            self.invalidations += 1
+            self._remove(key)
+            self._detach_load(key)
+
+    def _invalidate_group_local(self, group):
+        self._notify()
+        self.invalidations += 1
+        for key in list(self._groups.get(group, ())):
+            self._remove(key)
+        for key in [k for k, (_, g) in self._inflight.items() if g == group]:
+            self._detach_load(key)
+
+    def _clear_local(self):
+        self._notify()
+        self._entries.clear()
+        self._groups.clear()
+        self._bytes = 0
+        for key in list(self._inflight):
+            self._detach_load(key)
+
+    def _detach_load(self, key):
+        # Callers already waiting still get the result, but it isn't stored and new
+        # callers start a fresh load that sees the write
+        pending = self._inflight.pop(key, None)
+        if pending is not None:
+            self._stale_loads.add(pending[0])
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+            group = entry[3]
+            if group is not None:
+                keys = self._groups[group]
+                keys.discard(key)
+                if not keys:
+                    del self._groups[group]
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+
+class TieredCache(ReadThroughCache):
+    """Small in-process L1 in front of a shared Redis-protocol L2.
+
+    L1 misses are served from L2 before falling back to the loader, and loaded
+    values are written to both tiers. Every invalidation bumps a per-key or
+    per-group version in L2, and a loaded value is only stored if the versions
+    it was read under are unchanged, so a slow load cannot put back a value
+    that was invalidated meanwhile. Invalidations delete from L2 and are
+    published on a channel every worker subscribes to, so each worker's L1
+    drops the entry too. L1 entries use a short TTL to bound staleness if a
+    message is missed, and L1 is cleared whenever the subscription restarts.
+    """
+
+    def __init__(self, client=None, url=REDIS_URL, namespace=CACHE_NAMESPACE,
+                 l1_max_bytes=CACHE_L1_MAX_BYTES, l1_ttl=CACHE_L1_TTL,
+                 default_ttl=CACHE_TTL, enabled=CACHE_ENABLED):
+        super().__init__(max_bytes=l1_max_bytes, default_ttl=default_ttl, enabled=enabled)
+        self.url = url
+        self.namespace = namespace
+        self.l1_ttl = l1_ttl
+        self.channel = f"{namespace}:invalidate"
+        self.worker_id = uuid.uuid4().hex
+        self._client = client
+        self._listener = None
+        self._stopping = False
+
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+        self.l2_stale_writes = 0
+        self.published = 0
+        self.received = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+
+            self._client = redis.from_url(self.url)
+        return self._client
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def _group_key(self, group):
+        return f"{self.namespace}:group:{group}"
+
+    def _version_keys(self, keys, group):
+        names = [f"{self.namespace}:version:{key}" for key in keys]
+        if group is not None:
+            names.append(f"{self.namespace}:version:group:{group}")
+        return names
+
+    async def get_or_load(self, key, loader, ttl=None, group=None):
+        if not self.enabled:
+            return await loader()
+        ttl = ttl or self.default_ttl
+
+        async def load_through_l2():
+            # The versions are read before the loader runs, so any invalidation after it changes them
+            names = self._version_keys([key], group)
+            try:
+                raw, *versions = await self.client.mget([self._key(key), *names])
+            except Exception as e:
+                self.l2_errors += 1
+                print(f"❌ Shared cache read failed for {key}: {str(e)}")
+                raw = versions = None
+            if raw is not None:
+                self.l2_hits += 1
+                return json.loads(raw)
+
+            self.l2_misses += 1
+            value = await loader()
+            if value is not None and versions is not None:
+                await self._store_l2_many({key: value}, ttl, group, dict(zip(names, versions)))
+            return value
+
+        return await super().get_or_load(key, load_through_l2, ttl=min(ttl, self.l1_ttl), group=group)
+
+    async def get_many_or_load(self, keys, loader, ttl=None, group=None):
+        if not self.enabled:
+            return await super().get_many_or_load(keys, loader, ttl=ttl, group=group)
+        ttl = ttl or self.default_ttl
+
+        async def load_through_l2(missing):
+            names = self._version_keys(missing, group)
+            try:
+                raws = await self.client.mget([*(self._key(key) for key in missing), *names])
+                versions = dict(zip(names, raws[len(missing):]))
+            except Exception as e:
+                self.l2_errors += 1
+                print(f"❌ Shared cache read failed for {len(missing)} keys: {str(e)}")
+                raws, versions = [None] * len(missing), None
+
+            values, unresolved = {}, []
+            for key, raw in zip(missing, raws[:len(missing)]):
+                if raw is not None:
+                    values[key] = json.loads(raw)
+                else:
+                    unresolved.append(key)
+            self.l2_hits += len(values)
+            self.l2_misses += len(unresolved)
+
+            if unresolved:
+                loaded = {key: value for key, value in (await loader(unresolved)).items() if value is not None}
+                if loaded and versions is not None:
+                    watched = self._version_keys(loaded, group)
+                    await self._store_l2_many(loaded, ttl, group, {name: versions[name] for name in watched})
+                values.update(loaded)
+            return values
+
+        return await super().get_many_or_load(keys, load_through_l2, ttl=min(ttl, self.l1_ttl), group=group)
+
+    async def _store_l2_many(self, values, ttl, group, versions):
+        """Writes ``values`` to L2 unless ``versions``, version key -> value read before loading, changed."""
+        from redis.exceptions import WatchError
+
+        ttl = max(1, int(ttl))
+        names = list(versions)
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                # WATCH makes the version check and the write one atomic step
+                await pipe.watch(*names)
+                if await pipe.mget(names) != list(versions.values()):
+                    self.l2_stale_writes += 1
+                    return
+                pipe.multi()
+                for key, value in values.items():
+                    pipe.set(self._key(key), json.dumps(value, separators=(",", ":")), ex=ttl)
+                if group is not None:
+                    pipe.sadd(self._group_key(group), *values)
+                    pipe.expire(self._group_key(group), ttl * 2)
+                await pipe.execute()
+        except WatchError:
+            self.l2_stale_writes += 1
+        except Exception as e:
+            self.l2_errors += 1
+            print(f"❌ Shared cache write failed for {', '.join(values)}: {str(e)}")
+
+    async def invalidate(self, *keys):
+        self._invalidate_local(keys)
+        if keys:
+            await self._shared_invalidate(self._delete_keys(keys), {"keys": list(keys)})
+
+    async def invalidate_group(self, group):
+        self._invalidate_group_local(group)
+        await self._shared_invalidate(self._delete_group(group), {"group": group})
+
+    async def clear(self):
+        self._clear_local()
+        await self._shared_invalidate(None, {"clear": True})
+
+    async def _shared_invalidate(self, delete, message):
+        # The write has already committed by now, so a Redis outage must not fail the request;
+        # L2 entries then age out by TTL and other workers' L1 by CACHE_L1_TTL
+        try:
+            if delete is not None:
+                await delete
+            message["origin"] = self.worker_id
+            await self.client.publish(self.channel, json.dumps(message))
+            self.published += 1
+        except Exception as e:
+            self.l2_errors += 1
+            print(f"❌ Shared cache invalidation failed for {message}: {str(e)}")
+
+    def _bump_versions(self, pipe, names):
+        for name in names:
+            pipe.incr(name)
+            pipe.expire(name, _VERSION_TTL)
+
+    async def _delete_keys(self, keys):
+        async with self.client.pipeline(transaction=True) as pipe:
+            self._bump_versions(pipe, self._version_keys(keys, None))
+            pipe.delete(*(self._key(key) for key in keys))
+            await pipe.execute()
+
+    async def _delete_group(self, group):
+        # Loads that started before this can no longer store into the group
+        async with self.client.pipeline(transaction=True) as pipe:
+            self._bump_versions(pipe, self._version_keys([], group))
+            await pipe.execute()
+        # Rename first so entries stored from now on land in a fresh index set
+        group_key = self._group_key(group)
+        detached = f"{group_key}:{uuid.uuid4().hex}"
+        try:
+            await self.client.rename(group_key, detached)
+        except Exception as e:
+            # Redis answers "no such key" when nothing in the group is cached
+            if "no such key" in str(e).lower():
+                return
+            raise
+        members = await self.client.smembers(detached)
+        keys = [self._key(m.decode() if isinstance(m, bytes) else m) for m in members]
+        await self.client.delete(detached, *keys)
+
+    def _apply(self, message):
+        if message.get("origin") == self.worker_id:
+            return
+        self.received += 1
+        if message.get("clear"):
+            self._clear_local()
+        if message.get("group"):
+            self._invalidate_group_local(message["group"])
+        if message.get("keys"):
+            self._invalidate_local(message["keys"])
+
+    async def _listen(self):
+        while not self._stopping:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                # Anything published while we were not subscribed is lost, so start from a clean L1
+                self._clear_local()
+                while not self._stopping:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        self._apply(json.loads(message["data"]))
+            except Exception as e:
+                self._clear_local()
+                print(f"❌ Cache invalidation subscription dropped: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def start(self):
+        if self._listener is None:
+            self._stopping = False
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener is not None:
+            # The listener polls with a 1s timeout, so it notices the flag promptly
+            self._stopping = True
+            try:
+                await asyncio.wait_for(self._listener, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._listener = None
+        if self._client is not None:
+            await self._client.aclose()
+
+    def stats(self):
+        return {
+            **super().stats(),
+            "backend": "redis",
+            "l2_hits": self.l2_hits,
+            "l2_misses": self.l2_misses,
+            "l2_errors": self.l2_errors,
+            "l2_stale_writes": self.l2_stale_writes,
+            "published": self.published,
+            "received": self.received,
+        }
+
+
+def create_cache(backend=CACHE_BACKEND):
+    if backend == 'memory':
+        return ReadThroughCache()
+    if backend == 'redis':
+        return TieredCache()
+    raise ValueError(f"Unknown CACHE_BACKEND {backend!r}, expected 'memory' or 'redis'")
+
+
+cache = create_cache()
@@ -0,0 +1,290 @@
+import asyncio
+import os
+from collections import OrderedDict
+
+from database import db, DatabaseError, ER_NO_REFERENCED_ROW
+
+# Cart write-behind: changes are kept in memory and written to cart_items in batches
+CART_WRITE_BEHIND = os.getenv('CART_WRITE_BEHIND', 'true').lower() in ('1', 'true', 'yes')
+CART_FLUSH_INTERVAL = float(os.getenv('CART_FLUSH_INTERVAL', '1'))
+CART_FLUSH_MAX_CHANGES = int(os.getenv('CART_FLUSH_MAX_CHANGES', '500'))
+# Carts kept in memory; the least recently used ones are dropped past this
+CART_MAX_CARTS = int(os.getenv('CART_MAX_CARTS', '10000'))
+
+
+class UnknownUser(LookupError):
+    """Raised when a cart is requested for a user that does not exist."""
+
+
+class CartStore:
+    """Keeps active carts in memory and writes their changes to ``cart_items`` behind the request.
+
+    A change only updates the in-memory cart and marks the item dirty; dirty
+    items are written ``interval`` seconds after the first one, or as soon as
+    ``max_changes`` are waiting, with one ``INSERT ... ON DUPLICATE KEY
+    UPDATE`` and one ``DELETE`` per batch. Repeated changes to an item in
+    between collapse into its latest quantity. Callers that read
+    ``cart_items`` directly, such as checkout, call :meth:`flush` first.
+
+    The carts live in this process, so with write-behind several API
+    workers need requests for a user routed to the same worker. With
+    ``write_behind=False`` every change is written before it returns and
+    every request reads the cart from ``cart_items``, so no worker serves
+    a cart another one has changed since.
+    """
+
+    def __init__(self, write_behind=CART_WRITE_BEHIND, interval=CART_FLUSH_INTERVAL,
+                 max_changes=CART_FLUSH_MAX_CHANGES, max_carts=CART_MAX_CARTS):
+        self.write_behind = write_behind
+        self.interval = interval
+        self.max_changes = max_changes
+        self.max_carts = max_carts
+        # user_id -> {product_id: quantity} in the order items were added, least recently used first
+        self._carts = OrderedDict()
+        self._loading = {}
+        # user_id -> {product_id: quantity}, 0 meaning removed: not written yet / being written
+        self._dirty = {}
+        self._flushing = {}
+        self._dirty_count = 0
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._flushes = set()
+
+        self.changes = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.dropped = 0
+
+    async def get(self, user_id):
+        """The user's cart as ``{product_id: quantity}``. Raises :class:`UnknownUser`."""
+        return dict(await self._cart(user_id))
+
+    async def set(self, user_id, product_id, quantity):
+        cart = await self._cart(user_id)
+        cart[product_id] = quantity
+        await self._changed(user_id, product_id, quantity)
+
+    async def remove(self, user_id, product_id):
+        """Removes an item, returning False if it was not in the cart."""
+        cart = await self._cart(user_id)
+        if cart.pop(product_id, None) is None:
+            return False
+        await self._changed(user_id, product_id, 0)
+        return True
+
+    def forget(self, user_id):
+        """Drops the in-memory cart so the next read reloads it, e.g. after checkout emptied it.
+
+        Unwritten changes are kept and reapplied on reload.
+        """
+        self._carts.pop(user_id, None)
+
+    def discard(self, user_id):
+        """Drops the cart and its unwritten changes, for a user being deleted."""
+        self._carts.pop(user_id, None)
+        self._dirty_count -= len(self._dirty.pop(user_id, {}))
+
+    async def _cart(self, user_id):
+        if not self.write_behind:
+            # cart_items is up to date, but another worker may have changed it since
+            return await self._load(user_id)
+        cart = self._carts.get(user_id)
+        if cart is not None:
+            self._carts.move_to_end(user_id)
+            return cart
+        # Concurrent requests for a cart that isn't loaded share one query
+        loading = self._loading.get(user_id)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(user_id))
+            self._loading[user_id] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        return await asyncio.shield(loading)
+
+    async def _load(self, user_id):
+        while True:
+            flushes = self.flushes
+            rows = await self._read(user_id)
+            # A flush finishing mid-read leaves changes in neither the rows nor the pending maps
+            if flushes == self.flushes:
+                break
+        if not rows:
+            raise UnknownUser(f"User {user_id} not found")
+
+        cart = {row["product_id"]: row["quantity"] for row in rows if row["product_id"] is not None}
+        # Changes not in cart_items yet win over what was just read
+        for pending in (self._flushing.get(user_id, {}), self._dirty.get(user_id, {})):
+            for product_id, quantity in pending.items():
+                if quantity:
+                    cart[product_id] = quantity
+                else:
+                    cart.pop(product_id, None)
+        if self.write_behind:
+            self._carts[user_id] = cart
+            self._evict()
+        return cart
+
+    async def _read(self, user_id):
+        async with db.connection() as connection:
+            cursor = await connection.cursor(dictionary=True)
+            try:
+                # The LEFT JOIN tells an empty cart apart from a missing user in the same query
+                await cursor.execute("""
+                    SELECT u.user_id, ci.product_id, ci.quantity
+                    FROM users u LEFT JOIN cart_items ci ON ci.user_id = u.user_id
+                    WHERE u.user_id = %s
+                    ORDER BY ci.added_at, ci.product_id
+                """, (user_id,))
+                return await cursor.fetchall()
+            finally:
+                await cursor.close()
+
+    def _evict(self):
+        # Safe even with unwritten changes, since a reload reapplies them
+        while len(self._carts) > self.max_carts:
+            self._carts.popitem(last=False)
+
+    async def _changed(self, user_id, product_id, quantity):
+        self.changes += 1
+        pending = self._dirty.setdefault(user_id, {})
+        if product_id not in pending:
+            self._dirty_count += 1
+        pending[product_id] = quantity
+        if not self.write_behind:
+            await self.flush(user_id)
+        elif self._dirty_count >= self.max_changes:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval, self._flush_now)
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._dirty:
+            task = asyncio.ensure_future(self._flush_in_background())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush_in_background(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            # Pool timeouts surface as HTTPException, so anything short of cancellation is retried
+            detail = getattr(e, "detail", None) or str(e)
+            print(f"❌ Writing cart changes failed, retrying in {self.interval}s: {detail}")
+        finally:
+            if self._dirty and self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.interval, self._flush_now)
+
+    async def flush(self, user_id=None):
+        """Writes the pending changes, of one user or of everyone, in one transaction.
+
+        On failure the changes stay pending, unless newer ones replaced them,
+        and the error is raised: :class:`DatabaseError`, or ``HTTPException``
+        when no connection could be checked out.
+        """
+        # Serialised so an older batch can never land after a newer one for the same item
+        async with self._lock:
+            if user_id is None:
+                batch, self._dirty = self._dirty, {}
+            elif user_id in self._dirty:
+                batch = {user_id: self._dirty.pop(user_id)}
+            else:
+                return
+            if not batch:
+                return
+            self._dirty_count -= sum(len(items) for items in batch.values())
+            self._flushing = batch
+            try:
+                await self._write(batch)
+            except BaseException:
+                # Requeue whatever wasn't changed again while the batch was being written
+                for failed_user, items in batch.items():
+                    pending = self._dirty.setdefault(failed_user, {})
+                    for product_id, quantity in items.items():
+                        if product_id not in pending:
+                            pending[product_id] = quantity
+                            self._dirty_count += 1
+                raise
+            finally:
+                self._flushing = {}
+            self.flushes += 1
+
+    async def _write(self, batch):
+        # Sorted so concurrent writers and checkouts take the unique-key locks in the same order
+        rows = sorted(
+            (user_id, product_id, quantity)
+            for user_id, items in batch.items() for product_id, quantity in items.items()
+        )
+        async with db.connection() as connection:
+            cursor = await connection.cursor()
+            try:
+                try:
+                    await self._write_rows(cursor, rows)
+                    await connection.commit()
+                    self.rows_written += len(rows)
+                except DatabaseError as e:
+                    await connection.rollback()
+                    if e.errno != ER_NO_REFERENCED_ROW:
+                        raise
+                    # A user or product was deleted after the change; write row by row and drop those
+                    for row in rows:
+                        try:
+                            await self._write_rows(cursor, [row])
+                            await connection.commit()
+                            self.rows_written += 1
+                        except DatabaseError as row_error:
+                            await connection.rollback()
+                            if row_error.errno != ER_NO_REFERENCED_ROW:
+                                raise
+                            self.dropped += 1
+                            self._carts.get(row[0], {}).pop(row[1], None)
+                            print(f"❌ Dropped cart change for user {row[0]}, product {row[1]}: {str(row_error)}")
+            finally:
+                await cursor.close()
+
+    async def _write_rows(self, cursor, rows):
+        for start in range(0, len(rows), self.max_changes):
+            chunk = rows[start:start + self.max_changes]
+            upserts = [row for row in chunk if row[2]]
+            removals = [(user_id, product_id) for user_id, product_id, quantity in chunk if not quantity]
+            if upserts:
+                await cursor.executemany(
+                    "INSERT INTO cart_items (user_id, product_id, quantity) VALUES (%s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)",
+                    upserts,
+                )
+            if removals:
+                placeholders = ", ".join(["(%s, %s)"] * len(removals))
+                await cursor.execute(
+                    f"DELETE FROM cart_items WHERE (user_id, product_id) IN ({placeholders})",
+                    [value for pair in removals for value in pair],
+                )
+
+    async def close(self):
+        """Writes every pending change; called on shutdown."""
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        # A failed background flush may have re-armed the timer
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            print(f"❌ {self._dirty_count} cart changes could not be written on shutdown: {detail}")
+
+    def stats(self):
+        return {
+            "write_behind": self.write_behind,
+            "carts": len(self._carts),
+            "pending_changes": self._dirty_count,
+            "changes": self.changes,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "dropped": self.dropped,
+        }
+
+
+carts = CartStore()
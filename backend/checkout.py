@@ -0,0 +1,142 @@
+import asyncio
+import os
+import random
+from decimal import Decimal
+
+from database import DatabaseError, ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+
+# Checkout configuration
+CHECKOUT_MAX_RETRIES = int(os.getenv('CHECKOUT_MAX_RETRIES', '5'))
+CHECKOUT_RETRY_BACKOFF = float(os.getenv('CHECKOUT_RETRY_BACKOFF', '0.01'))
+
+_RETRYABLE = (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT)
+
+
+class CheckoutError(Exception):
+    """Base class for checkout failures caused by the request rather than the database."""
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+class InvalidAddress(CheckoutError):
+    pass
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, shortages):
+        super().__init__("Insufficient stock for " + ", ".join(
+            f"product {s['product_id']} (requested {s['requested']}, available {s['available']})"
+            for s in shortages
+        ))
+        self.shortages = shortages
+
+
+async def checkout(connection, user_id, shipping_address_id, payment_method):
+    """Turns a user's cart into an order, retrying the transaction on deadlock.
+
+    Returns the order as a dict. Raises a :class:`CheckoutError` subclass for
+    bad input, or :class:`DatabaseError` once retries are exhausted.
+    """
+    attempt = 0
+    while True:
+        cursor = await connection.cursor(dictionary=True)
+        try:
+            order = await _checkout_once(cursor, user_id, shipping_address_id, payment_method)
+            await connection.commit()
+            return order
+        except DatabaseError as e:
+            await connection.rollback()
+            if e.errno not in _RETRYABLE or attempt >= CHECKOUT_MAX_RETRIES:
+                raise
+            attempt += 1
+            print(f"❌ Checkout for user {user_id} hit lock error {e.errno}, retry {attempt}/{CHECKOUT_MAX_RETRIES}")
+            # Jittered exponential backoff so the colliding transactions don't meet again
+            await asyncio.sleep(CHECKOUT_RETRY_BACKOFF * (2 ** attempt) * random.random())
+        except CheckoutError:
+            await connection.rollback()
+            raise
+        finally:
+            await cursor.close()
+
+
+async def _checkout_once(cursor, user_id, shipping_address_id, payment_method):
+    # Lock the cart first so two checkouts of the same cart serialise here
+    await cursor.execute(
+        "SELECT product_id, quantity FROM cart_items WHERE user_id = %s FOR UPDATE", (user_id,)
+    )
+    quantities = {row["product_id"]: row["quantity"] for row in await cursor.fetchall()}
+    if not quantities:
+        raise EmptyCart("Cart is empty")
+
+    # Lock product rows through the primary key in ascending order, so checkouts sharing
+    # products wait for each other rather than lock them crosswise. Other writers (stock
+    # batches, bulk imports, product edits) and the foreign-key checks of the inserts below
+    # take locks in their own order, so a deadlock is still possible; checkout() retries it
+    product_ids = sorted(quantities)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    await cursor.execute(
+        f"SELECT product_id, price, stock_quantity FROM products "
+        f"WHERE product_id IN ({placeholders}) ORDER BY product_id FOR UPDATE",
+        product_ids,
+    )
+    products = {row["product_id"]: row for row in await cursor.fetchall()}
+
+    shortages = [
+        {
+            "product_id": product_id,
+            "requested": quantities[product_id],
+            "available": products[product_id]["stock_quantity"] if product_id in products else 0,
+        }
+        for product_id in product_ids
+        if product_id not in products or products[product_id]["stock_quantity"] < quantities[product_id]
+    ]
+    if shortages:
+        raise OutOfStock(shortages)
+
+    # The rows are locked, so one statement can decrement every line without re-checking
+    cases = " ".join(["WHEN %s THEN %s"] * len(product_ids))
+    case_params = [value for product_id in product_ids for value in (product_id, quantities[product_id])]
+    await cursor.execute(
+        f"UPDATE products SET stock_quantity = stock_quantity - CASE product_id {cases} END "
+        f"WHERE product_id IN ({placeholders})",
+        (*case_params, *product_ids),
+    )
+
+    total = sum((Decimal(products[p]["price"]) * quantities[p] for p in product_ids), Decimal("0"))
+
+    # Inserting through the address row both validates ownership and creates the order
+    await cursor.execute(
+        """
+        INSERT INTO orders (user_id, total_amount, status, shipping_address_id)
+        SELECT %s, %s, 'pending', address_id FROM addresses WHERE address_id = %s AND user_id = %s
+        """,
+        (user_id, total, shipping_address_id, user_id),
+    )
+    if cursor.rowcount == 0:
+        raise InvalidAddress(f"Address {shipping_address_id} does not belong to user {user_id}")
+    order_id = cursor.lastrowid
+
+    items = [
+        {"product_id": p, "quantity": quantities[p], "unit_price": products[p]["price"]}
+        for p in product_ids
+    ]
+    await cursor.executemany(
+        "INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES (%s, %s, %s, %s)",
+        [(order_id, item["product_id"], item["quantity"], item["unit_price"]) for item in items],
+    )
+    await cursor.execute(
+        "INSERT INTO payments (order_id, amount, payment_method, payment_status) VALUES (%s, %s, %s, 'pending')",
+        (order_id, total, payment_method),
+    )
+    await cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (user_id,))
+
+    return {
+        "order_id": order_id,
+        "user_id": user_id,
+        "status": "pending",
+        "total_amount": total,
+        "shipping_address_id": shipping_address_id,
+        "items": items,
+    }
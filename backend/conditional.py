@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi.responses import Response
+
+from fastjson import ResponseClass
+
+# HTTP caching configuration: with everything at 0, clients revalidate on every use (no-cache)
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '0'))
+HTTP_CATEGORY_MAX_AGE = int(os.getenv('HTTP_CATEGORY_MAX_AGE', '0'))
+# Freshness for shared caches only (s-maxage), for a CDN or reverse proxy in front of the API
+HTTP_CACHE_SHARED_MAX_AGE = int(os.getenv('HTTP_CACHE_SHARED_MAX_AGE', '0'))
+HTTP_CATEGORY_SHARED_MAX_AGE = int(os.getenv('HTTP_CATEGORY_SHARED_MAX_AGE', '0'))
+HTTP_CACHE_STALE_WHILE_REVALIDATE = int(os.getenv('HTTP_CACHE_STALE_WHILE_REVALIDATE', '0'))
+
+
+def with_validators(body, updated_at=()):
+    """Wraps a jsonable body with its weak ETag and Last-Modified for caching.
+
+    The ETag hashes the serialized body, so it changes whenever the row data
+    or the set of rows does, even within the one-second resolution of
+    ``updated_at``. It is computed once when the entry is loaded, so cache
+    hits answer conditional requests without touching the body.
+
+    Pass ``updated_at`` only for a single row: the newest timestamp of a list
+    stays the same when a row is deleted or the order changes. The values
+    are read as UTC, which holds because connections set ``time_zone`` to UTC.
+    """
+    raw = json.dumps(body, separators=(",", ":"), sort_keys=True).encode()
+    stamps = [datetime.fromisoformat(value) for value in updated_at if value]
+    return {
+        "etag": f'W/"{hashlib.sha1(raw).hexdigest()[:20]}"',
+        "last_modified": format_datetime(max(stamps).replace(tzinfo=timezone.utc), usegmt=True) if stamps else None,
+        "body": body,
+    }
+
+
+def _etag_matches(header, etag):
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored on both sides
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def _not_modified(request, entry):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, entry["etag"])
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and entry["last_modified"]:
+        try:
+            return parsedate_to_datetime(entry["last_modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cache_control(max_age=0, shared_max_age=0):
+    """The Cache-Control value for a conditional read: revalidate every time unless a max-age is set."""
+    if not max_age and not shared_max_age:
+        return "no-cache"
+    directives = ["public", f"max-age={max_age}"]
+    if not max_age:
+        # Only the shared cache may reuse the response; browsers still revalidate each time
+        directives.append("must-revalidate")
+    if shared_max_age:
+        directives.append(f"s-maxage={shared_max_age}")
+    if HTTP_CACHE_STALE_WHILE_REVALIDATE:
+        directives.append(f"stale-while-revalidate={HTTP_CACHE_STALE_WHILE_REVALIDATE}")
+    return ", ".join(directives)
+
+
+def conditional_response(request, entry, max_age=HTTP_CACHE_MAX_AGE, shared_max_age=HTTP_CACHE_SHARED_MAX_AGE):
+    """Answers with 304 when the client's validators match ``entry``, otherwise with the body."""
+    headers = {
+        "ETag": entry["etag"],
+        "Cache-Control": cache_control(max_age, shared_max_age),
+    }
+    if entry["last_modified"]:
+        headers["Last-Modified"] = entry["last_modified"]
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return ResponseClass(entry["body"], headers=headers)
@@ -43,6 +43,31 @@ CREATE TABLE categories (
     CONSTRAINT fk_categories_parent FOREIGN KEY (parent_category_id) REFERENCES categories(category_id)
 );
 
+-- -----------------------------------------------------
+-- Table `category_closure`
+-- One row per (ancestor, descendant) pair, including each category with
+-- itself at depth 0; maintained by the category endpoints
+-- -----------------------------------------------------
+CREATE TABLE category_closure (
+    ancestor_id INT NOT NULL,
+    descendant_id INT NOT NULL,
+    depth INT NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id),
+    KEY idx_category_closure_descendant (descendant_id, depth),
+    CONSTRAINT fk_category_closure_ancestor FOREIGN KEY (ancestor_id) REFERENCES categories(category_id) ON DELETE CASCADE,
+    CONSTRAINT fk_category_closure_descendant FOREIGN KEY (descendant_id) REFERENCES categories(category_id) ON DELETE CASCADE
+);
+
+-- Backfill for an existing categories table (safe to re-run)
+INSERT IGNORE INTO category_closure (ancestor_id, descendant_id, depth)
+WITH RECURSIVE tree AS (
+    SELECT category_id AS ancestor_id, category_id AS descendant_id, 0 AS depth FROM categories
+    UNION ALL
+    SELECT tree.ancestor_id, c.category_id, tree.depth + 1
+    FROM tree JOIN categories c ON c.parent_category_id = tree.descendant_id
+)
+SELECT ancestor_id, descendant_id, depth FROM tree;
+
 -- -----------------------------------------------------
 -- Table `products`
 -- -----------------------------------------------------
@@ -114,11 +139,250 @@ CREATE TABLE cart_items (
     UNIQUE KEY unique_user_product (user_id, product_id)
 );
 
+-- -----------------------------------------------------
+-- Table `idempotency_keys`
+-- Responses of requests sent with an Idempotency-Key header, replayed when
+-- the same key comes back (PATCH /products/stock)
+-- -----------------------------------------------------
+CREATE TABLE idempotency_keys (
+    idempotency_key VARCHAR(255) PRIMARY KEY,
+    request_hash CHAR(64) NOT NULL,
+    response JSON NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_idempotency_keys_created (created_at)
+);
+
 -- -----------------------------------------------------
 -- Indexes for performance optimization
 -- -----------------------------------------------------
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_products_category ON products(category_id);
+-- Keyset pagination: (sort key, product_id) so "after" cursors seek instead of scanning
+CREATE INDEX idx_products_price ON products(price, product_id);
+CREATE INDEX idx_products_created ON products(created_at, product_id);
+CREATE INDEX idx_products_category_price ON products(category_id, price, product_id);
+CREATE INDEX idx_products_category_created ON products(category_id, created_at, product_id);
+-- Relevance-ranked search for GET /products/search
+CREATE FULLTEXT INDEX ft_products_name_description ON products(name, description);
 CREATE INDEX idx_orders_user ON orders(user_id);
+-- Range locks and scans for the sales rollup backfill
+CREATE INDEX idx_orders_date ON orders(order_date);
 CREATE INDEX idx_order_items_order ON order_items(order_id);
 CREATE INDEX idx_payments_order ON payments(order_id);
+
+-- -----------------------------------------------------
+-- Dashboard summary tables (GET /stats)
+-- Kept current by the triggers below so the dashboard reads a handful of
+-- rows instead of scanning users and products. Product writes only queue
+-- their effect on category_stats in category_stats_queue; the API's
+-- RollupDrainer (rollups.py) applies queued deltas after the writing
+-- transaction has committed, so checkouts, stock updates and imports never
+-- lock the category_stats rows that every write to a category shares.
+-- -----------------------------------------------------
+CREATE TABLE store_stats (
+    stat_id TINYINT PRIMARY KEY,
+    user_count INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE category_stats (
+    category_id INT PRIMARY KEY,
+    product_count INT NOT NULL DEFAULT 0,
+    stock_quantity BIGINT NOT NULL DEFAULT 0,
+    inventory_value DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    CONSTRAINT fk_category_stats_categories FOREIGN KEY (category_id) REFERENCES categories(category_id) ON DELETE CASCADE
+);
+
+-- Product changes waiting to be added to category_stats; amounts are negative for removals
+CREATE TABLE category_stats_queue (
+    queue_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    category_id INT NOT NULL,
+    product_count INT NOT NULL,
+    stock_quantity BIGINT NOT NULL,
+    inventory_value DECIMAL(16, 2) NOT NULL
+);
+
+DELIMITER //
+
+CREATE TRIGGER trg_users_stats_insert AFTER INSERT ON users
+FOR EACH ROW
+    UPDATE store_stats SET user_count = user_count + 1 WHERE stat_id = 1//
+
+CREATE TRIGGER trg_users_stats_delete AFTER DELETE ON users
+FOR EACH ROW
+    UPDATE store_stats SET user_count = user_count - 1 WHERE stat_id = 1//
+
+CREATE TRIGGER trg_categories_stats_insert AFTER INSERT ON categories
+FOR EACH ROW
+    INSERT INTO category_stats (category_id) VALUES (NEW.category_id)//
+
+CREATE TRIGGER trg_products_stats_insert AFTER INSERT ON products
+FOR EACH ROW
+    INSERT INTO category_stats_queue (category_id, product_count, stock_quantity, inventory_value)
+    VALUES (NEW.category_id, 1, NEW.stock_quantity, NEW.price * NEW.stock_quantity)//
+
+CREATE TRIGGER trg_products_stats_update AFTER UPDATE ON products
+FOR EACH ROW
+BEGIN
+    -- Name, description and image edits leave the stats alone
+    IF OLD.category_id = NEW.category_id THEN
+        IF OLD.price <> NEW.price OR OLD.stock_quantity <> NEW.stock_quantity THEN
+            INSERT INTO category_stats_queue (category_id, product_count, stock_quantity, inventory_value)
+            VALUES (NEW.category_id, 0, NEW.stock_quantity - OLD.stock_quantity,
+                    NEW.price * NEW.stock_quantity - OLD.price * OLD.stock_quantity);
+        END IF;
+    ELSE
+        INSERT INTO category_stats_queue (category_id, product_count, stock_quantity, inventory_value)
+        VALUES (OLD.category_id, -1, -OLD.stock_quantity, -OLD.price * OLD.stock_quantity),
+               (NEW.category_id, 1, NEW.stock_quantity, NEW.price * NEW.stock_quantity);
+    END IF;
+END//
+
+CREATE TRIGGER trg_products_stats_delete AFTER DELETE ON products
+FOR EACH ROW
+    INSERT INTO category_stats_queue (category_id, product_count, stock_quantity, inventory_value)
+    VALUES (OLD.category_id, -1, -OLD.stock_quantity, -OLD.price * OLD.stock_quantity)//
+
+DELIMITER ;
+
+-- Backfill (also safe to re-run to resynchronise an existing database while
+-- product writes are paused; queued deltas are already counted by the rebuild)
+INSERT INTO store_stats (stat_id, user_count)
+SELECT 1, COUNT(*) FROM users
+ON DUPLICATE KEY UPDATE user_count = VALUES(user_count);
+
+DELETE FROM category_stats_queue;
+
+INSERT INTO category_stats (category_id, product_count, stock_quantity, inventory_value)
+SELECT c.category_id, COUNT(p.product_id), COALESCE(SUM(p.stock_quantity), 0), COALESCE(SUM(p.price * p.stock_quantity), 0)
+FROM categories c
+LEFT JOIN products p ON p.category_id = c.category_id
+GROUP BY c.category_id
+ON DUPLICATE KEY UPDATE
+    product_count = VALUES(product_count),
+    stock_quantity = VALUES(stock_quantity),
+    inventory_value = VALUES(inventory_value);
+
+-- -----------------------------------------------------
+-- Sales rollups (GET /analytics/...)
+-- Units sold and revenue per hour and per day, by product and by category,
+-- over every order that is not cancelled. Triggers queue each order line
+-- in sales_rollup_queue as it is written and as orders move in or out of
+-- 'cancelled'; the API's RollupDrainer (rollups.py) adds queued lines to the
+-- rollups in batches after the writing transaction has committed, so
+-- checkouts never lock the rollup rows other sales share.
+-- backfill_rollups.py rebuilds them from the orders for a date range.
+-- Categories are attributed as of when the sale is rolled up.
+-- -----------------------------------------------------
+CREATE TABLE sales_product_hourly (
+    bucket DATETIME NOT NULL,
+    product_id INT NOT NULL,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, product_id)
+);
+
+CREATE TABLE sales_product_daily (
+    bucket DATE NOT NULL,
+    product_id INT NOT NULL,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, product_id)
+);
+
+CREATE TABLE sales_category_hourly (
+    bucket DATETIME NOT NULL,
+    category_id INT NOT NULL,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, category_id)
+);
+
+CREATE TABLE sales_category_daily (
+    bucket DATE NOT NULL,
+    category_id INT NOT NULL,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, category_id)
+);
+
+-- Order lines waiting to be added to the rollups; amounts are negative for removals
+CREATE TABLE sales_rollup_queue (
+    queue_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    bucket DATETIME NOT NULL,
+    product_id INT NOT NULL,
+    units INT NOT NULL,
+    revenue DECIMAL(16, 2) NOT NULL,
+    INDEX idx_sales_rollup_queue_bucket (bucket)
+);
+
+DELIMITER //
+
+-- Queues one order line (or with negative amounts, its removal) for the rollups
+CREATE PROCEDURE queue_sale(IN p_order_date TIMESTAMP, IN p_product_id INT, IN p_units INT, IN p_revenue DECIMAL(16, 2))
+BEGIN
+    INSERT INTO sales_rollup_queue (bucket, product_id, units, revenue)
+    VALUES (DATE(p_order_date) + INTERVAL HOUR(p_order_date) HOUR, p_product_id, p_units, p_revenue);
+END//
+
+-- Queues every line of an order, for status changes in or out of 'cancelled'
+CREATE PROCEDURE queue_order(IN p_order_id INT, IN p_sign INT)
+BEGIN
+    INSERT INTO sales_rollup_queue (bucket, product_id, units, revenue)
+    SELECT DATE(o.order_date) + INTERVAL HOUR(o.order_date) HOUR, oi.product_id,
+           p_sign * SUM(oi.quantity), p_sign * SUM(oi.quantity * oi.unit_price)
+    FROM orders o JOIN order_items oi ON oi.order_id = o.order_id
+    WHERE o.order_id = p_order_id
+    GROUP BY 1, 2;
+END//
+
+CREATE TRIGGER trg_orders_sales_update AFTER UPDATE ON orders
+FOR EACH ROW
+BEGIN
+    IF (OLD.status = 'cancelled') <> (NEW.status = 'cancelled') THEN
+        CALL queue_order(NEW.order_id, IF(NEW.status = 'cancelled', -1, 1));
+    END IF;
+END//
+
+-- Order lines are deleted by ON DELETE CASCADE without firing their triggers, so remove them here
+CREATE TRIGGER trg_orders_sales_delete BEFORE DELETE ON orders
+FOR EACH ROW
+BEGIN
+    IF OLD.status <> 'cancelled' THEN
+        CALL queue_order(OLD.order_id, -1);
+    END IF;
+END//
+
+CREATE TRIGGER trg_order_items_sales_insert AFTER INSERT ON order_items
+FOR EACH ROW
+BEGIN
+    DECLARE v_order_date TIMESTAMP;
+    SELECT order_date INTO v_order_date FROM orders WHERE order_id = NEW.order_id AND status <> 'cancelled';
+    IF v_order_date IS NOT NULL THEN
+        CALL queue_sale(v_order_date, NEW.product_id, NEW.quantity, NEW.quantity * NEW.unit_price);
+    END IF;
+END//
+
+CREATE TRIGGER trg_order_items_sales_update AFTER UPDATE ON order_items
+FOR EACH ROW
+BEGIN
+    DECLARE v_order_date TIMESTAMP;
+    SELECT order_date INTO v_order_date FROM orders WHERE order_id = NEW.order_id AND status <> 'cancelled';
+    IF v_order_date IS NOT NULL THEN
+        CALL queue_sale(v_order_date, OLD.product_id, -OLD.quantity, -OLD.quantity * OLD.unit_price);
+        CALL queue_sale(v_order_date, NEW.product_id, NEW.quantity, NEW.quantity * NEW.unit_price);
+    END IF;
+END//
+
+CREATE TRIGGER trg_order_items_sales_delete AFTER DELETE ON order_items
+FOR EACH ROW
+BEGIN
+    DECLARE v_order_date TIMESTAMP;
+    SELECT order_date INTO v_order_date FROM orders WHERE order_id = OLD.order_id AND status <> 'cancelled';
+    IF v_order_date IS NOT NULL THEN
+        CALL queue_sale(v_order_date, OLD.product_id, -OLD.quantity, -OLD.quantity * OLD.unit_price);
+    END IF;
+END//
+
+DELIMITER ;
+
+-- Existing orders are rolled up with: python backfill_rollups.py
@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from database import db
+
+# Export configuration
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    # Match the API's JSON output: decimals as numbers, datetimes in ISO format
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_ndjson(rows, columns):
+    return "".join(
+        json.dumps({c: row[c] for c in columns}, default=_json_default, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def _encode_csv(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            row[c].isoformat() if isinstance(row[c], (datetime, date)) else row[c]
+            for c in columns
+        ])
+    return buffer.getvalue()
+
+
+def _encode_header(columns):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue()
+
+
+async def stream_query(query, params, columns, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields encoded chunks of a query's rows read through an unbuffered cursor.
+
+    Only ``chunk_size`` rows are held in memory at a time. The generator owns
+    its pooled connection, which is released when it finishes or is closed.
+    """
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    async with db.connection() as connection:
+        cursor = await connection.cursor(dictionary=True, unbuffered=True)
+        try:
+            await cursor.execute(query, params)
+            # Always yield once up front so callers can surface query errors before streaming
+            yield _encode_header(columns) if fmt == "csv" else ""
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield encode(rows, columns)
+        finally:
+            await cursor.close()
@@ -0,0 +1,67 @@
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Opt-in fast serialization for row-heavy responses
+FAST_JSON = os.getenv('FAST_JSON', 'false').lower() in ('1', 'true', 'yes')
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder with JSONResponse's settings
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _convert(value):
+    # Only the types MySQL drivers hand back need converting; everything else is already JSON
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def dumps(content):
+    """Encodes exactly as Starlette's JSONResponse does, using orjson when it is installed."""
+    if orjson is not None:
+        # Datetimes go through isoformat() so the output matches the stdlib path
+        return orjson.dumps(content, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def rows_jsonable(rows, model):
+    """Turns DB rows into jsonable dicts shaped like ``model``.
+
+    With ``FAST_JSON`` the rows are trusted to already have the model's types:
+    each is projected onto the model's fields in one pass, converting only
+    ``Decimal`` and ``datetime``, instead of being validated per row.
+    """
+    if not FAST_JSON:
+        return jsonable_encoder([model.model_validate(row).model_dump() for row in rows])
+    fields = tuple(model.model_fields)
+    return [{name: _convert(row[name]) for name in fields} for row in rows]
+
+
+def row_jsonable(row, model):
+    return rows_jsonable([row], model)[0]
+
+
+ResponseClass = FastJSONResponse if FAST_JSON else JSONResponse
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Password hashing configuration
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+HASH_MAX_QUEUE = int(os.getenv('HASH_MAX_QUEUE', '32'))
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+
+_worker_contexts = {}
+
+
+def _context(rounds):
+    context = _worker_contexts.get(rounds)
+    if context is None:
+        from passlib.context import CryptContext
+
+        context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        _worker_contexts[rounds] = context
+    return context
+
+
+def _hash_password(password, rounds):
+    """Runs inside a worker process; returns the hash and when the work actually started."""
+    started_at = time.time()
+    return _context(rounds).hash(password), started_at
+
+
+def _load_backend(rounds):
+    """Runs inside a worker process: imports passlib and loads the bcrypt backend without hashing."""
+    _context(rounds).handler("bcrypt").get_backend()
+    return os.getpid()
+
+
+class HashingSaturated(Exception):
+    """Raised when the hashing queue is full and the caller should back off."""
+
+
+class PasswordHasher:
+    """Hashes passwords on a dedicated, size-limited process pool.
+
+    At most ``workers`` hashes run at once and up to ``max_queue`` more may wait;
+    beyond that :meth:`hash` raises :class:`HashingSaturated` instead of queueing.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, max_queue=HASH_MAX_QUEUE, rounds=BCRYPT_ROUNDS):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._executor = None
+        self._pending = 0
+
+        self._hashed = 0
+        self._rejected = 0
+        self._hash_seconds_total = 0.0
+        self._hash_seconds_max = 0.0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn keeps forked copies of the event loop and its threads out of the workers
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    async def hash(self, password):
+        if self._pending >= self.workers + self.max_queue:
+            self._rejected += 1
+            raise HashingSaturated("Password hashing is saturated, retry shortly")
+
+        self._pending += 1
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            hashed, started_at = await loop.run_in_executor(
+                self._get_executor(), _hash_password, password, self.rounds
+            )
+        finally:
+            self._pending -= 1
+        finished_at = time.time()
+
+        wait_seconds = max(0.0, started_at - submitted_at)
+        hash_seconds = max(0.0, finished_at - started_at)
+        self._hashed += 1
+        self._wait_seconds_total += wait_seconds
+        self._wait_seconds_max = max(self._wait_seconds_max, wait_seconds)
+        self._hash_seconds_total += hash_seconds
+        self._hash_seconds_max = max(self._hash_seconds_max, hash_seconds)
+        return hashed
+
+    async def warm(self):
+        """Starts the worker processes and loads bcrypt in each, so the first sign-up doesn't pay for it.
+
+        Returns the number of worker processes that are up.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # Submitted together so the executor spawns a process per task rather than reusing one
+        pids = await asyncio.gather(
+            *(loop.run_in_executor(executor, _load_backend, self.rounds) for _ in range(self.workers))
+        )
+        return len(set(pids))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        hashed = self._hashed or 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "rounds": self.rounds,
+            "pending": self._pending,
+            "hashed": self._hashed,
+            "rejected": self._rejected,
+            "hash_seconds_avg": self._hash_seconds_total / hashed,
+            "hash_seconds_max": self._hash_seconds_max,
+            "queue_wait_seconds_avg": self._wait_seconds_total / hashed,
+            "queue_wait_seconds_max": self._wait_seconds_max,
+        }
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,69 @@
+class CategoryCycle(ValueError):
+    """Raised when moving a category would place it under one of its own descendants."""
+
+
+# Products in a category or any of its descendants, as a condition on products.category_id
+SUBTREE_CONDITION = "category_id IN (SELECT descendant_id FROM category_closure WHERE ancestor_id = %s)"
+
+
+async def add_category(cursor, category_id, parent_id):
+    """Adds closure rows for a new category: itself plus every ancestor of its parent."""
+    if parent_id is None:
+        await cursor.execute(
+            "INSERT INTO category_closure (ancestor_id, descendant_id, depth) VALUES (%s, %s, 0)",
+            (category_id, category_id),
+        )
+        return
+    await cursor.execute(
+        """
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, %s, depth + 1 FROM category_closure WHERE descendant_id = %s
+        UNION ALL
+        SELECT %s, %s, 0
+        """,
+        (category_id, parent_id, category_id, category_id),
+    )
+
+
+async def check_move(cursor, category_id, parent_id):
+    """Raises :class:`CategoryCycle` if ``parent_id`` lies in the subtree of ``category_id``.
+
+    The read locks the (category, parent) closure entry or the gap where it
+    would go, so a concurrent move that would complete the cycle has to wait
+    for this transaction instead of slipping past the check.
+    """
+    await cursor.execute(
+        "SELECT 1 FROM category_closure WHERE ancestor_id = %s AND descendant_id = %s FOR UPDATE",
+        (category_id, parent_id),
+    )
+    if await cursor.fetchone():
+        raise CategoryCycle(f"Category {parent_id} is a descendant of category {category_id}")
+
+
+async def move_category(cursor, category_id, parent_id):
+    """Re-links the subtree rooted at ``category_id`` under ``parent_id``.
+
+    Call :func:`check_move` first, in the same transaction.
+    """
+    # Detach the subtree from every ancestor outside it
+    await cursor.execute(
+        """
+        DELETE link FROM category_closure link
+        JOIN category_closure subtree ON subtree.descendant_id = link.descendant_id
+        LEFT JOIN category_closure inner_link
+            ON inner_link.ancestor_id = subtree.ancestor_id AND inner_link.descendant_id = link.ancestor_id
+        WHERE subtree.ancestor_id = %s AND inner_link.ancestor_id IS NULL
+        """,
+        (category_id,),
+    )
+    # Attach it under the new parent and all of the parent's ancestors
+    await cursor.execute(
+        """
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+        FROM category_closure above
+        JOIN category_closure below
+        WHERE above.descendant_id = %s AND below.ancestor_id = %s
+        """,
+        (parent_id, category_id),
+    )
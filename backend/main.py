@@ -1,21 +1,65 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-import mysql.connector
-from mysql.connector import Error
-from datetime import datetime
-import os
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional, Union
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import asyncio
 import traceback
-from passlib.context import CryptContext
 
 load_dotenv()
 
-app = FastAPI(title="E-commerce Store API", version="1.0.0")
+from database import (
+    db, get_db, get_read_db, DatabaseError, QueryCountMiddleware, DB_QUERY_COUNT_HEADER,
+    ER_DUP_ENTRY, ER_ROW_IS_REFERENCED, ER_NO_REFERENCED_ROW,
+)
+from hashing import hasher, HashingSaturated
+from pagination import encode_cursor, decode_cursor, keyset_condition, InvalidCursor
+from cache import cache, CACHE_CATEGORY_TTL
+from bulk_import import import_products, iter_csv, iter_ndjson, BULK_BATCH_SIZE
+from export import stream_query, MEDIA_TYPES
+from search import build_boolean_query, fetch_search_results
+from hierarchy import add_category, check_move, move_category, CategoryCycle, SUBTREE_CONDITION
+from checkout import checkout, CheckoutError, OutOfStock
+from analytics import resolve_range, revenue_series, top_products, category_sales, InvalidRange, utcnow
+from batch import parse_ids, check_ids, fetch_by_ids, InvalidBatch
+from cart import carts, UnknownUser
+from rollups import rollups
+from stock import stock_updates, IdempotencyConflict, STOCK_MAX_UPDATES, IDEMPOTENCY_KEY_MAX_LENGTH
+from fastjson import ResponseClass, FAST_JSON, rows_jsonable, row_jsonable
+from conditional import with_validators, conditional_response, HTTP_CATEGORY_MAX_AGE, HTTP_CATEGORY_SHARED_MAX_AGE
+from replicas import ReadYourWritesMiddleware
+from metrics import MetricsMiddleware, METRICS_ENABLED, register_pool, render as render_metrics
+from warmup import (
+    warmup, WARMUP_ENABLED, WARMUP_DB_CONNECTIONS, WARMUP_HOT_PRODUCTS, WARMUP_HOT_DAYS, READINESS_TIMEOUT,
+)
 
-# Initialize password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@asynccontextmanager
+async def lifespan(app):
+    await cache.start()
+    await db.start()
+    await rollups.start()
+    # Warmed in the background: liveness passes at once, readiness once this is done
+    warmup.start([
+        ("db_pool", lambda: db.warm(WARMUP_DB_CONNECTIONS)),
+        ("hashing", hasher.warm),
+        ("categories", warm_categories),
+        ("hot_products", warm_hot_products),
+    ] if WARMUP_ENABLED else [])
+    yield
+    await warmup.close()
+    # Pending stock batches and cart changes still need the pool
+    await stock_updates.close()
+    await carts.close()
+    await rollups.close()
+    await db.close()
+    hasher.shutdown()
+    await cache.close()
+
+app = FastAPI(title="E-commerce Store API", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -26,22 +70,19 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Database connection
-def get_db_connection():
-    """Establishes and returns a new database connection."""
-    try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            database=os.getenv('DB_NAME', 'ecommerce_store'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            autocommit=False
-        )
-        return connection
-    except Error as e:
-        print(f"❌ Database connection failed: {str(e)}")
-        print(f"❌ Connection details: host={os.getenv('DB_HOST')}, db={os.getenv('DB_NAME')}, user={os.getenv('DB_USER')}")
-        raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
+if DB_QUERY_COUNT_HEADER:
+    app.add_middleware(QueryCountMiddleware)
+
+if db.router.replicas:
+    # POST only because the ID list can outgrow a URL; it reads, so it must not pin the client to the primary
+    app.add_middleware(ReadYourWritesMiddleware, router=db.router, read_only_routes=[("POST", "/users/batch")])
+    # Cache loads after any invalidation, local or from another worker, read the primary for a while
+    cache.on_invalidate(db.router.note_write)
+
+if METRICS_ENABLED:
+    # Added last so it is outermost and times the whole middleware stack
+    app.add_middleware(MetricsMiddleware)
+    register_pool(db.stats)
 
 # Pydantic models
 class UserCreate(BaseModel):
@@ -75,6 +116,10 @@ class ProductCreate(BaseModel):
     category_id: int
     image_url: Optional[str] = None
 
+class ProductImportRow(ProductCreate):
+    # Rows carrying an existing product_id update that product instead of inserting
+    product_id: Optional[int] = None
+
 class ProductResponse(BaseModel):
     product_id: int
     name: str
@@ -86,6 +131,59 @@ class ProductResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str]
+
+class ProductPage(BaseModel):
+    items: List[ProductResponse]
+    next_cursor: Optional[str]
+
+class UserBatchRequest(BaseModel):
+    ids: List[int]
+
+class UserBatchResponse(BaseModel):
+    items: List[UserResponse]
+    missing: List[int]
+
+class ProductBatchResponse(BaseModel):
+    items: List[ProductResponse]
+    missing: List[int]
+
+class StockUpdate(BaseModel):
+    product_id: int
+    delta: Optional[int] = None
+    quantity: Optional[int] = Field(None, ge=0)
+
+    @model_validator(mode="after")
+    def one_change(self):
+        if (self.delta is None) == (self.quantity is None):
+            raise ValueError("Give exactly one of delta or quantity")
+        return self
+
+class StockUpdateRequest(BaseModel):
+    updates: List[StockUpdate] = Field(min_length=1, max_length=STOCK_MAX_UPDATES)
+
+class StockLevel(BaseModel):
+    product_id: int
+    stock_quantity: int
+
+class StockUpdateResponse(BaseModel):
+    updated: List[StockLevel]
+    missing: List[int]
+
+class ProductSearchResult(ProductResponse):
+    score: float
+
+class CategoryFacet(BaseModel):
+    category_id: int
+    count: int
+
+class ProductSearchResponse(BaseModel):
+    items: List[ProductSearchResult]
+    total: int
+    facets: List[CategoryFacet]
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -109,9 +207,160 @@ class CategoryUpdate(BaseModel):
     description: Optional[str] = None
     parent_category_id: Optional[int] = None
 
+class CategoryStats(BaseModel):
+    category_id: int
+    name: str
+    products: int
+    stock_quantity: int
+    inventory_value: float
+
+class StatsResponse(BaseModel):
+    users: int
+    products: int
+    categories: int
+    stock_quantity: int
+    inventory_value: float
+    by_category: List[CategoryStats]
+
+class AddressCreate(BaseModel):
+    street_address: str
+    city: str
+    state: str
+    zip_code: str
+    country: str
+    is_default: bool = False
+
+class AddressResponse(AddressCreate):
+    address_id: int
+    user_id: int
+
+class CartItemUpdate(BaseModel):
+    quantity: int = Field(..., ge=1)
+
+class CartItemResponse(BaseModel):
+    product_id: int
+    name: str
+    price: float
+    quantity: int
+
+class CheckoutRequest(BaseModel):
+    shipping_address_id: int
+    payment_method: str
+
+class OrderItemResponse(BaseModel):
+    product_id: int
+    quantity: int
+    unit_price: float
+
+class OrderResponse(BaseModel):
+    order_id: int
+    user_id: int
+    status: str
+    total_amount: float
+    shipping_address_id: int
+    items: List[OrderItemResponse]
+
+class RevenuePoint(BaseModel):
+    bucket: datetime
+    units: int
+    revenue: float
+
+class ProductSales(BaseModel):
+    product_id: int
+    name: str
+    units: int
+    revenue: float
+
+class CategorySales(BaseModel):
+    category_id: int
+    name: str
+    units: int
+    revenue: float
+
+# Cache invalidation helpers
+async def invalidate_products(*product_ids):
+    """Drops cached rows for the given products and every cached product list page."""
+    await cache.invalidate(*(f"product:{product_id}" for product_id in product_ids))
+    await cache.invalidate_group("products:list")
+
+def product_entry(row):
+    """The cached form of one product row, shared by single and batch reads."""
+    product = row_jsonable(row, ProductResponse)
+    return with_validators(product, [product["updated_at"]])
+
+async def load_products(keys):
+    """Cache loader for ``product:{id}`` keys, reading every missing product with one query."""
+    async with db.connection(read_only=True, shared=True) as connection:
+        cursor = await connection.cursor(dictionary=True)
+        try:
+            rows = await fetch_by_ids(cursor, "products", "product_id", [int(k.split(":")[1]) for k in keys])
+        finally:
+            await cursor.close()
+    return {f"product:{product_id}": product_entry(row) for product_id, row in rows.items()}
+
+async def load_categories():
+    async with db.connection(read_only=True, shared=True) as connection:
+        cursor = await connection.cursor(dictionary=True)
+        try:
+            await cursor.execute("SELECT * FROM categories")
+            # categories has no updated_at, so only the ETag validates this list
+            return with_validators(rows_jsonable(await cursor.fetchall(), CategoryResponse))
+        finally:
+            await cursor.close()
+
+async def invalidate_categories():
+    await cache.invalidate("categories:all")
+    await cache.invalidate_group("categories:tree")
+
+# Startup warm-up and readiness helpers
+async def warm_categories():
+    entry = await cache.get_or_load("categories:all", load_categories, ttl=CACHE_CATEGORY_TTL)
+    return len(entry["body"])
+
+async def warm_hot_products():
+    """Loads the best sellers of the last ``WARMUP_HOT_DAYS`` days into the read cache."""
+    start, end = resolve_range(utcnow() - timedelta(days=WARMUP_HOT_DAYS), None)
+    async with db.connection(read_only=True) as connection:
+        cursor = await connection.cursor(dictionary=True)
+        try:
+            rows = await top_products(cursor, start, end, WARMUP_HOT_PRODUCTS, "units")
+        finally:
+            await cursor.close()
+    if rows:
+        await cache.get_many_or_load([f"product:{row['product_id']}" for row in rows], load_products)
+    return len(rows)
+
+async def ping_database():
+    async with db.connection() as connection:
+        cursor = await connection.cursor()
+        try:
+            await cursor.execute("SELECT 1")
+            await cursor.fetchone()
+        finally:
+            await cursor.close()
+
+# Streaming export helper
+async def export_response(query, params, columns, fmt, filename):
+    chunks = stream_query(query, params, columns, fmt)
+    try:
+        # Run the query before committing to a 200 so errors still get a proper status
+        first = await chunks.__anext__()
+    except DatabaseError as e:
+        print(f"❌ Database error in export of {filename}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[fmt], headers={
+        "Content-Disposition": f'attachment; filename="{filename}.{fmt}"'
+    })
+
 # Root endpoint
 @app.get("/")
-def read_root():
+async def read_root():
     return {
         "message": "Welcome to E-commerce Store API",
         "version": "1.0.0",
@@ -123,212 +372,326 @@ def read_root():
         }
     }
 
+@app.exception_handler(HashingSaturated)
+async def hashing_saturated_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # Health check endpoint
 @app.get("/health")
-def health_check():
+async def health_check():
     try:
-        connection = get_db_connection()
-        connection.close()
-        return {"status": "healthy", "database": "connected"}
+        async with db.connection():
+            pass
+        return {"status": "healthy", "database": "connected", "pool": db.stats(), "hashing": hasher.stats(), "cache": cache.stats(), "stock_updates": stock_updates.stats(), "carts": carts.stats(), "rollups": rollups.stats(), "warmup": warmup.stats()}
     except Exception as e:
-        return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
+        return {"status": "unhealthy", "database": "disconnected", "error": str(e), "pool": db.stats()}
 
-# Users CRUD Operations
-@app.post("/users/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-    
+# Liveness: the process is up and its event loop responds; no I/O
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+# Readiness: warm-up has finished and the database answers through the pool
+@app.get("/health/ready")
+async def readiness():
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "warming", "warmup": warmup.stats()})
     try:
-        # Check if email already exists
-        cursor.execute("SELECT * FROM users WHERE email = %s", (user.email,))
-        if cursor.fetchone():
-            raise HTTPException(status_code=400, detail="Email already registered")
-        
-        # Hash the password before storing
-        hashed_password = pwd_context.hash(user.password)
+        await asyncio.wait_for(ping_database(), READINESS_TIMEOUT)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "error": str(e) or type(e).__name__})
+    return {"status": "ready"}
 
-        # Insert new user
-        query = """
-            INSERT INTO users (email, password_hash, first_name, last_name, phone_number)
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        cursor.execute(query, (user.email, hashed_password, user.first_name, user.last_name, user.phone_number))
-        connection.commit()
-        
-        # Get the created user
-        cursor.execute("SELECT * FROM users WHERE user_id = %s", (cursor.lastrowid,))
-        created_user = cursor.fetchone()
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+# Dashboard statistics, read from the trigger-maintained summary tables
+@app.get("/stats", response_model=StatsResponse)
+async def get_stats(connection=Depends(get_db)):
+    cursor = await connection.cursor(dictionary=True)
+    
+    try:
+        # One row per category; the LEFT JOINs keep the user count when there are no categories
+        await cursor.execute("""
+            SELECT s.user_count, c.category_id, c.name,
+                   cs.product_count, cs.stock_quantity, cs.inventory_value
+            FROM store_stats s
+            LEFT JOIN category_stats cs ON TRUE
+            LEFT JOIN categories c ON c.category_id = cs.category_id
+            WHERE s.stat_id = 1
+            ORDER BY cs.category_id
+        """)
+        rows = await cursor.fetchall()
         
-        return created_user
+        by_category = [
+            {
+                "category_id": row["category_id"],
+                "name": row["name"],
+                "products": row["product_count"],
+                "stock_quantity": row["stock_quantity"],
+                "inventory_value": row["inventory_value"],
+            }
+            for row in rows if row["category_id"] is not None
+        ]
+        return {
+            "users": rows[0]["user_count"] if rows else 0,
+            "products": sum(c["products"] for c in by_category),
+            "categories": len(by_category),
+            "stock_quantity": sum(c["stock_quantity"] for c in by_category),
+            "inventory_value": sum(c["inventory_value"] for c in by_category),
+            "by_category": by_category,
+        }
         
-    except Error as e:
-        connection.rollback()
-        print(f"❌ Database error in create_user: {str(e)}")
-        print(f"❌ Error details: {traceback.format_exc()}")
+    except DatabaseError as e:
+        print(f"❌ Database error in get_stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await cursor.close()
+
+# Users CRUD Operations
+@app.post("/users/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def create_user(user: UserCreate):
+    # Hash before checking out a connection so bcrypt never holds a pooled connection
+    hashed_password = await hasher.hash(user.password)
+
+    async with db.connection() as connection:
+        cursor = await connection.cursor(dictionary=True)
+
+        try:
+            # Insert new user; the UNIQUE index on email rejects duplicates
+            query = """
+                INSERT INTO users (email, password_hash, first_name, last_name, phone_number)
+                VALUES (%s, %s, %s, %s, %s)
+            """
+            await cursor.execute(query, (user.email, hashed_password, user.first_name, user.last_name, user.phone_number))
+            await connection.commit()
+
+            # Get the created user
+            await cursor.execute("SELECT * FROM users WHERE user_id = %s", (cursor.lastrowid,))
+            created_user = await cursor.fetchone()
+
+            return created_user
+
+        except DatabaseError as e:
+            await connection.rollback()
+            if e.errno == ER_DUP_ENTRY:
+                raise HTTPException(status_code=400, detail="Email already registered")
+            print(f"❌ Database error in create_user: {str(e)}")
+            print(f"❌ Error details: {traceback.format_exc()}")
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        finally:
+            await cursor.close()
+
+@app.get("/users/export")
+async def export_users(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    columns = list(UserResponse.model_fields)
+    query = f"SELECT {', '.join(columns)} FROM users ORDER BY user_id"
+    return await export_response(query, (), columns, format, "users")
+
+@app.post("/users/batch", response_model=UserBatchResponse)
+async def get_users_batch(request: UserBatchRequest, connection=Depends(get_read_db)):
+    """Fetches up to ``BATCH_MAX_IDS`` users in one query, in request order."""
+    try:
+        user_ids = check_ids(request.ids)
+    except InvalidBatch as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cursor = await connection.cursor(dictionary=True)
+
+    try:
+        users = await fetch_by_ids(cursor, "users", "user_id", user_ids, ", ".join(UserResponse.model_fields))
+        items = [users[user_id] for user_id in user_ids if user_id in users]
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        if FAST_JSON:
+            return ResponseClass({"items": rows_jsonable(items, UserResponse), "missing": missing})
+        return {"items": items, "missing": missing}
+
+    except DatabaseError as e:
+        print(f"❌ Database error in get_users_batch: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        cursor.close()
-        connection.close()
+        await cursor.close()
 
 @app.get("/users/{user_id}", response_model=UserResponse)
-def get_user(user_id: int):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+async def get_user(user_id: int, connection=Depends(get_read_db)):
+    cursor = await connection.cursor(dictionary=True)
     
     try:
-        cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
-        user = cursor.fetchone()
+        await cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
+        user = await cursor.fetchone()
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         return user
         
-    except Error as e:
+    except DatabaseError as e:
         print(f"❌ Database error in get_user: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        cursor.close()
-        connection.close()
+        await cursor.close()
 
-@app.get("/users/", response_model=List[UserResponse])
-def get_users(skip: int = 0, limit: int = 10):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+@app.get("/users/", response_model=Union[List[UserResponse], UserPage])
+async def get_users(
+    skip: int = 0,
+    limit: int = 10,
+    paginate: str = Query("offset", pattern="^(offset|cursor)$"),
+    after: Optional[str] = None,
+    connection=Depends(get_read_db),
+):
+    cursor = await connection.cursor(dictionary=True)
     
     try:
-        cursor.execute("SELECT * FROM users LIMIT %s OFFSET %s", (limit, skip))
-        users = cursor.fetchall()
-        return users
+        if paginate == "offset" and after is None:
+            await cursor.execute("SELECT * FROM users ORDER BY user_id LIMIT %s OFFSET %s", (limit, skip))
+            users = await cursor.fetchall()
+            if FAST_JSON:
+                return ResponseClass(rows_jsonable(users, UserResponse))
+            return users
+
+        # Cursor mode: seek past the last seen user_id instead of scanning skipped rows
+        if limit < 1:
+            raise HTTPException(status_code=400, detail="limit must be at least 1 in cursor mode")
+        conditions, params = [], []
+        if after:
+            _, last_id = decode_cursor(after, "user_id")
+            clause, clause_params = keyset_condition("user_id", "user_id", None, last_id)
+            conditions.append(clause)
+            params.extend(clause_params)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        await cursor.execute(f"SELECT * FROM users {where}ORDER BY user_id LIMIT %s", (*params, limit + 1))
+        users = await cursor.fetchall()
+
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor("user_id", users[-1], "user_id", "user_id")
+        if FAST_JSON:
+            return ResponseClass({"items": rows_jsonable(users, UserResponse), "next_cursor": next_cursor})
+        return {"items": users, "next_cursor": next_cursor}
         
-    except Error as e:
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseError as e:
         print(f"❌ Database error in get_users: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        cursor.close()
-        connection.close()
+        await cursor.close()
 
 @app.put("/users/{user_id}", response_model=UserResponse)
-def update_user(user_id: int, user_update: UserUpdate):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-    
-    try:
-        # Check if user exists
-        cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
-        existing_user = cursor.fetchone()
-        if not existing_user:
-            raise HTTPException(status_code=404, detail="User not found")
+async def update_user(user_id: int, user_update: UserUpdate):
+    # Build dynamic update query
+    update_fields = []
+    update_values = []
 
-        # Build dynamic update query
-        update_fields = []
-        update_values = []
-        
-        if user_update.email is not None:
-            # Check for unique email
-            cursor.execute("SELECT * FROM users WHERE email = %s AND user_id != %s", (user_update.email, user_id))
-            if cursor.fetchone():
+    if user_update.email is not None:
+        update_fields.append("email = %s")
+        update_values.append(user_update.email)
+
+    if user_update.password is not None:
+        # Hash the new password before checking out a connection
+        hashed_password = await hasher.hash(user_update.password)
+        update_fields.append("password_hash = %s")
+        update_values.append(hashed_password)
+
+    if user_update.first_name is not None:
+        update_fields.append("first_name = %s")
+        update_values.append(user_update.first_name)
+
+    if user_update.last_name is not None:
+        update_fields.append("last_name = %s")
+        update_values.append(user_update.last_name)
+
+    if user_update.phone_number is not None:
+        update_fields.append("phone_number = %s")
+        update_values.append(user_update.phone_number)
+
+    if not update_fields:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    update_values.append(user_id)
+    query = f"UPDATE users SET {', '.join(update_fields)} WHERE user_id = %s"
+
+    async with db.connection() as connection:
+        cursor = await connection.cursor(dictionary=True)
+
+        try:
+            # rowcount counts matched rows, so 0 means the user does not exist
+            await cursor.execute(query, update_values)
+            if cursor.rowcount == 0:
+                raise HTTPException(status_code=404, detail="User not found")
+            await connection.commit()
+
+            await cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
+            updated_user = await cursor.fetchone()
+
+            return updated_user
+
+        except DatabaseError as e:
+            await connection.rollback()
+            if e.errno == ER_DUP_ENTRY:
                 raise HTTPException(status_code=400, detail="Email already registered by another user")
-            update_fields.append("email = %s")
-            update_values.append(user_update.email)
-        
-        if user_update.password is not None:
-            # Hash the new password
-            hashed_password = pwd_context.hash(user_update.password)
-            update_fields.append("password_hash = %s")
-            update_values.append(hashed_password)
-        
-        if user_update.first_name is not None:
-            update_fields.append("first_name = %s")
-            update_values.append(user_update.first_name)
-        
-        if user_update.last_name is not None:
-            update_fields.append("last_name = %s")
-            update_values.append(user_update.last_name)
-        
-        if user_update.phone_number is not None:
-            update_fields.append("phone_number = %s")
-            update_values.append(user_update.phone_number)
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No fields to update")
-        
-        update_values.append(user_id)
-        query = f"UPDATE users SET {', '.join(update_fields)} WHERE user_id = %s"
-        
-        cursor.execute(query, update_values)
-        connection.commit()
-        
-        cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
-        updated_user = cursor.fetchone()
-        
-        return updated_user
-        
-    except Error as e:
-        connection.rollback()
-        print(f"❌ Database error in update_user: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        cursor.close()
-        connection.close()
+            print(f"❌ Database error in update_user: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        finally:
+            await cursor.close()
 
 @app.delete("/users/{user_id}")
-def delete_user(user_id: int):
-    connection = get_db_connection()
-    cursor = connection.cursor()
+async def delete_user(user_id: int, connection=Depends(get_db)):
+    cursor = await connection.cursor()
     
     try:
-        # Check if user exists
-        cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
-        if not cursor.fetchone():
+        await cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+        if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="User not found")
-        
-        cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
-        connection.commit()
+        await connection.commit()
+        # The database cascade removed the cart rows; drop any buffered changes too
+        carts.discard(user_id)
         
         return {"message": "User deleted successfully"}
         
-    except Error as e:
-        connection.rollback()
+    except DatabaseError as e:
+        await connection.rollback()
+        if e.errno == ER_ROW_IS_REFERENCED:
+            raise HTTPException(status_code=409, detail="User has orders and cannot be deleted")
         print(f"❌ Database error in delete_user: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        cursor.close()
-        connection.close()
+        await cursor.close()
 
 # Products CRUD Operations
 @app.post("/products/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
-def create_product(product: ProductCreate):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+async def create_product(product: ProductCreate, connection=Depends(get_db)):
+    cursor = await connection.cursor(dictionary=True)
     
     try:
-        # Check if category exists
-        cursor.execute("SELECT * FROM categories WHERE category_id = %s", (product.category_id,))
-        category = cursor.fetchone()
-        if not category:
-            raise HTTPException(status_code=400, detail=f"Category with ID {product.category_id} does not exist")
-        
-        # Insert product
+        # Insert product; the category foreign key rejects unknown categories
         query = """
             INSERT INTO products (name, description, price, stock_quantity, category_id, image_url)
             VALUES (%s, %s, %s, %s, %s, %s)
         """
-        cursor.execute(query, (
+        await cursor.execute(query, (
             product.name, product.description, product.price, 
             product.stock_quantity, product.category_id, product.image_url
         ))
-        connection.commit()
+        await connection.commit()
+        await invalidate_products(cursor.lastrowid)
         
         # Get the created product
-        cursor.execute("SELECT * FROM products WHERE product_id = %s", (cursor.lastrowid,))
-        created_product = cursor.fetchone()
+        await cursor.execute("SELECT * FROM products WHERE product_id = %s", (cursor.lastrowid,))
+        created_product = await cursor.fetchone()
         
         return created_product
         
-    except Error as e:
-        connection.rollback()
+    except DatabaseError as e:
+        await connection.rollback()
+        if e.errno == ER_NO_REFERENCED_ROW:
+            raise HTTPException(status_code=400, detail=f"Category with ID {product.category_id} does not exist")
         print(f"❌ Database error in create_product: {str(e)}")
         print(f"❌ Error details: {traceback.format_exc()}")
         print(f"❌ Product data: {product.dict()}")
@@ -336,67 +699,244 @@ def create_product(product: ProductCreate):
     except HTTPException:
         raise
     except Exception as e:
-        connection.rollback()
+        await connection.rollback()
         print(f"❌ Unexpected error in create_product: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
     finally:
-        cursor.close()
-        connection.close()
+        await cursor.close()
+
+@app.post("/products/bulk")
+async def bulk_import_products(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(BULK_BATCH_SIZE, ge=1, le=10000),
+):
+    """Streams an NDJSON or CSV body of products and upserts them in batches.
+
+    Returns a per-row error report; rows that fail validation or the database
+    are reported and skipped without aborting the rest of the import.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    records = iter_csv(request.stream()) if format == "csv" else iter_ndjson(request.stream())
+
+    updated_ids = []
+    try:
+        async with db.connection() as connection:
+            try:
+                report = await import_products(connection, records, ProductImportRow, updated_ids, batch_size)
+            except DatabaseError as e:
+                await connection.rollback()
+                print(f"❌ Database error in bulk_import_products: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+            except UnicodeDecodeError as e:
+                await connection.rollback()
+                raise HTTPException(status_code=400, detail=f"Request body is not valid UTF-8: {str(e)}")
+    finally:
+        await invalidate_products(*updated_ids)
+
+    return report.as_dict()
+
+@app.patch("/products/stock", response_model=StockUpdateResponse)
+async def update_stock(request: StockUpdateRequest, idempotency_key: Optional[str] = Header(None)):
+    """Applies many stock changes, each either a ``delta`` or an absolute ``quantity``.
+
+    Requests arriving within ``STOCK_COALESCE_WINDOW_MS`` are committed together.
+    With an ``Idempotency-Key`` header a retried request gets the stored
+    response instead of being applied again. Deltas never take stock below zero.
+    """
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+
+    updates = [update.model_dump() for update in request.updates]
+    try:
+        result, replayed = await stock_updates.submit(updates, idempotency_key)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except DatabaseError as e:
+        print(f"❌ Database error in update_stock: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if replayed:
+        return JSONResponse(result, headers={"Idempotent-Replayed": "true"})
+    await invalidate_products(*(level["product_id"] for level in result["updated"]))
+    return result
+
+@app.get("/products/export")
+async def export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    category_id: Optional[int] = None,
+    include_descendants: bool = False,
+):
+    columns = list(ProductResponse.model_fields)
+    conditions, params = [], []
+    if category_id:
+        # Same filters as GET /products/
+        conditions.append(SUBTREE_CONDITION if include_descendants else "category_id = %s")
+        params.append(category_id)
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    query = f"SELECT {', '.join(columns)} FROM products {where}ORDER BY product_id"
+    return await export_response(query, params, columns, format, "products")
+
+@app.get("/products/search", response_model=ProductSearchResponse)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    category_id: Optional[int] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    prefix: bool = True,
+):
+    expression = build_boolean_query(q, prefix)
+    if expression is None:
+        return {"items": [], "total": 0, "facets": []}
+
+    async def load():
+        async with db.connection() as connection:
+            cursor = await connection.cursor(dictionary=True)
+            try:
+                rows, facets = await fetch_search_results(cursor, expression, category_id, skip, limit)
+            finally:
+                await cursor.close()
+        # Facets cover every category, so the filtered total is read off them instead of counted again
+        total = sum(f["count"] for f in facets if not category_id or f["category_id"] == category_id)
+        return jsonable_encoder({"items": rows, "total": total, "facets": facets})
+
+    # Cached with the list pages so any product write invalidates results
+    cache_key = f"products:list:search:{expression}:{category_id}:{skip}:{limit}"
+    try:
+        return await cache.get_or_load(cache_key, load, group="products:list")
+    except DatabaseError as e:
+        print(f"❌ Database error in search_products: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@app.get("/products/batch", response_model=ProductBatchResponse)
+async def get_products_batch(ids: str = Query(..., description="Comma-separated product IDs")):
+    """Fetches up to ``BATCH_MAX_IDS`` products in request order.
+
+    Products already in the read cache are served from it; the rest are read
+    with a single ``IN`` query and cached under the same keys as
+    ``GET /products/{id}``.
+    """
+    try:
+        product_ids = parse_ids(ids)
+    except InvalidBatch as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        entries = await cache.get_many_or_load([f"product:{product_id}" for product_id in product_ids], load_products)
+    except DatabaseError as e:
+        print(f"❌ Database error in get_products_batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    entries = [(product_id, entries[f"product:{product_id}"]) for product_id in product_ids]
+    # Cached bodies are already shaped by ProductResponse
+    return ResponseClass({
+        "items": [entry["body"] for _, entry in entries if entry],
+        "missing": [product_id for product_id, entry in entries if not entry],
+    })
 
 @app.get("/products/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-    
+async def get_product(product_id: int, request: Request):
+    async def load():
+        async with db.connection(read_only=True, shared=True) as connection:
+            cursor = await connection.cursor(dictionary=True)
+            try:
+                await cursor.execute("SELECT * FROM products WHERE product_id = %s", (product_id,))
+                product = await cursor.fetchone()
+                return product_entry(product) if product else None
+            finally:
+                await cursor.close()
+
     try:
-        cursor.execute("SELECT * FROM products WHERE product_id = %s", (product_id,))
-        product = cursor.fetchone()
-        
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        return product
-        
-    except Error as e:
+        entry = await cache.get_or_load(f"product:{product_id}", load)
+    except DatabaseError as e:
         print(f"❌ Database error in get_product: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        cursor.close()
-        connection.close()
 
-@app.get("/products/", response_model=List[ProductResponse])
-def get_products(skip: int = 0, limit: int = 10, category_id: Optional[int] = None):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-    
+    if not entry:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    return conditional_response(request, entry)
+
+@app.get("/products/", response_model=Union[List[ProductResponse], ProductPage])
+async def get_products(
+    request: Request,
+    skip: int = 0,
+    limit: int = 10,
+    category_id: Optional[int] = None,
+    include_descendants: bool = False,
+    sort: str = Query("product_id", pattern="^(product_id|price|created_at)$"),
+    paginate: str = Query("offset", pattern="^(offset|cursor)$"),
+    after: Optional[str] = None,
+):
     try:
-        if category_id:
-            cursor.execute("SELECT * FROM products WHERE category_id = %s LIMIT %s OFFSET %s", 
-                         (category_id, limit, skip))
+        key = decode_cursor(after, sort) if after else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if (paginate == "cursor" or key is not None) and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1 in cursor mode")
+
+    async def load():
+        async with db.connection(read_only=True, shared=True) as connection:
+            cursor = await connection.cursor(dictionary=True)
+            try:
+                page = await _fetch_products_page(
+                    cursor, skip, limit, category_id, include_descendants, sort, paginate, key
+                )
+            finally:
+                await cursor.close()
+        if isinstance(page, dict):
+            page = {"items": rows_jsonable(page["items"], ProductResponse), "next_cursor": page["next_cursor"]}
+            items = page["items"]
         else:
-            cursor.execute("SELECT * FROM products LIMIT %s OFFSET %s", (limit, skip))
-        
-        products = cursor.fetchall()
-        return products
-        
-    except Error as e:
+            page = items = rows_jsonable(page, ProductResponse)
+        # No Last-Modified: deleting or reordering rows changes a page without changing its newest updated_at
+        return with_validators(page)
+
+    cache_key = f"products:list:{category_id}:{include_descendants}:{sort}:{paginate}:{after}:{skip}:{limit}"
+    try:
+        entry = await cache.get_or_load(cache_key, load, group="products:list")
+    except DatabaseError as e:
         print(f"❌ Database error in get_products: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        cursor.close()
-        connection.close()
+
+    return conditional_response(request, entry)
+
+async def _fetch_products_page(cursor, skip, limit, category_id, include_descendants, sort, paginate, key):
+    conditions, params = [], []
+    if category_id:
+        # The closure table turns a whole subtree into one indexed semi-join
+        conditions.append(SUBTREE_CONDITION if include_descendants else "category_id = %s")
+        params.append(category_id)
+    # product_id breaks ties so the order is stable for non-unique sort keys
+    order_by = "product_id" if sort == "product_id" else f"{sort}, product_id"
+
+    if paginate == "offset" and key is None:
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        await cursor.execute(f"SELECT * FROM products {where}ORDER BY {order_by} LIMIT %s OFFSET %s",
+                             (*params, limit, skip))
+        return await cursor.fetchall()
+
+    # Cursor mode: seek past the last seen (sort key, product_id) via the composite index
+    if key is not None:
+        clause, clause_params = keyset_condition(sort, "product_id", *key)
+        conditions.append(clause)
+        params.extend(clause_params)
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    await cursor.execute(f"SELECT * FROM products {where}ORDER BY {order_by} LIMIT %s", (*params, limit + 1))
+    products = await cursor.fetchall()
+
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = encode_cursor(sort, products[-1], sort, "product_id")
+    return {"items": products, "next_cursor": next_cursor}
 
 @app.put("/products/{product_id}", response_model=ProductResponse)
-def update_product(product_id: int, product_update: ProductUpdate):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+async def update_product(product_id: int, product_update: ProductUpdate, connection=Depends(get_db)):
+    cursor = await connection.cursor(dictionary=True)
     
     try:
-        # Check if product exists
-        cursor.execute("SELECT * FROM products WHERE product_id = %s", (product_id,))
-        if not cursor.fetchone():
-            raise HTTPException(status_code=404, detail="Product not found")
-        
         # Build dynamic update query
         update_fields = []
         update_values = []
@@ -423,101 +963,122 @@ def update_product(product_id: int, product_update: ProductUpdate):
         update_values.append(product_id)
         query = f"UPDATE products SET {', '.join(update_fields)} WHERE product_id = %s"
         
-        cursor.execute(query, update_values)
-        connection.commit()
+        # rowcount counts matched rows, so 0 means the product does not exist
+        await cursor.execute(query, update_values)
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Product not found")
+        await connection.commit()
+        await invalidate_products(product_id)
         
-        cursor.execute("SELECT * FROM products WHERE product_id = %s", (product_id,))
-        updated_product = cursor.fetchone()
+        await cursor.execute("SELECT * FROM products WHERE product_id = %s", (product_id,))
+        updated_product = await cursor.fetchone()
         
         return updated_product
         
-    except Error as e:
-        connection.rollback()
+    except DatabaseError as e:
+        await connection.rollback()
         print(f"❌ Database error in update_product: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        cursor.close()
-        connection.close()
+        await cursor.close()
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: int):
-    connection = get_db_connection()
-    cursor = connection.cursor()
+async def delete_product(product_id: int, connection=Depends(get_db)):
+    cursor = await connection.cursor()
     
     try:
-        # Check if product exists
-        cursor.execute("SELECT * FROM products WHERE product_id = %s", (product_id,))
-        if not cursor.fetchone():
+        await cursor.execute("DELETE FROM products WHERE product_id = %s", (product_id,))
+        if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Product not found")
-        
-        cursor.execute("DELETE FROM products WHERE product_id = %s", (product_id,))
-        connection.commit()
+        await connection.commit()
+        await invalidate_products(product_id)
         
         return {"message": "Product deleted successfully"}
         
-    except Error as e:
-        connection.rollback()
+    except DatabaseError as e:
+        await connection.rollback()
+        if e.errno == ER_ROW_IS_REFERENCED:
+            raise HTTPException(status_code=409, detail="Product is referenced by orders or carts and cannot be deleted")
         print(f"❌ Database error in delete_product: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        cursor.close()
-        connection.close()
+        await cursor.close()
 
 # Categories endpoints
 @app.post("/categories/", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
-def create_category(category: CategoryCreate):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+async def create_category(category: CategoryCreate, connection=Depends(get_db)):
+    cursor = await connection.cursor(dictionary=True)
     
     try:
         query = """
             INSERT INTO categories (name, description, parent_category_id)
             VALUES (%s, %s, %s)
         """
-        cursor.execute(query, (category.name, category.description, category.parent_category_id))
-        connection.commit()
+        await cursor.execute(query, (category.name, category.description, category.parent_category_id))
+        category_id = cursor.lastrowid
+        await add_category(cursor, category_id, category.parent_category_id)
+        await connection.commit()
+        await invalidate_categories()
         
-        cursor.execute("SELECT * FROM categories WHERE category_id = %s", (cursor.lastrowid,))
-        created_category = cursor.fetchone()
+        # Every column is known from the insert, so there is nothing to read back
+        return {"category_id": category_id, **category.model_dump()}
         
-        return created_category
-        
-    except Error as e:
-        connection.rollback()
+    except DatabaseError as e:
+        await connection.rollback()
+        if e.errno == ER_NO_REFERENCED_ROW:
+            raise HTTPException(status_code=400, detail=f"Parent category with ID {category.parent_category_id} does not exist")
         print(f"❌ Database error in create_category: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        cursor.close()
-        connection.close()
+        await cursor.close()
 
 @app.get("/categories/", response_model=List[CategoryResponse])
-def get_categories():
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-    
+async def get_categories(request: Request):
     try:
-        cursor.execute("SELECT * FROM categories")
-        categories = cursor.fetchall()
-        return categories
-        
-    except Error as e:
+        entry = await cache.get_or_load("categories:all", load_categories, ttl=CACHE_CATEGORY_TTL)
+    except DatabaseError as e:
         print(f"❌ Database error in get_categories: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        cursor.close()
-        connection.close()
+
+    return conditional_response(
+        request, entry, max_age=HTTP_CATEGORY_MAX_AGE, shared_max_age=HTTP_CATEGORY_SHARED_MAX_AGE
+    )
+
+@app.get("/categories/{category_id}/ancestors", response_model=List[CategoryResponse])
+async def get_category_ancestors(category_id: int):
+    """Breadcrumb for a category: its ancestors from the root down, ending with the category itself."""
+    async def load():
+        async with db.connection() as connection:
+            cursor = await connection.cursor(dictionary=True)
+            try:
+                await cursor.execute("""
+                    SELECT c.* FROM category_closure cc
+                    JOIN categories c ON c.category_id = cc.ancestor_id
+                    WHERE cc.descendant_id = %s
+                    ORDER BY cc.depth DESC
+                """, (category_id,))
+                return jsonable_encoder(await cursor.fetchall()) or None
+            finally:
+                await cursor.close()
+
+    try:
+        ancestors = await cache.get_or_load(
+            f"categories:tree:ancestors:{category_id}", load, ttl=CACHE_CATEGORY_TTL, group="categories:tree"
+        )
+    except DatabaseError as e:
+        print(f"❌ Database error in get_category_ancestors: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if not ancestors:
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    return ancestors
 
 @app.put("/categories/{category_id}", response_model=CategoryResponse)
-def update_category(category_id: int, category_update: CategoryUpdate):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+async def update_category(category_id: int, category_update: CategoryUpdate, connection=Depends(get_db)):
+    cursor = await connection.cursor(dictionary=True)
     
     try:
-        # Check if category exists
-        cursor.execute("SELECT * FROM categories WHERE category_id = %s", (category_id,))
-        if not cursor.fetchone():
-            raise HTTPException(status_code=404, detail="Category not found")
-        
         # Build dynamic update query
         update_fields = []
         update_values = []
@@ -541,45 +1102,245 @@ def update_category(category_id: int, category_update: CategoryUpdate):
         update_values.append(category_id)
         query = f"UPDATE categories SET {', '.join(update_fields)} WHERE category_id = %s"
         
-        cursor.execute(query, update_values)
-        connection.commit()
+        moving = category_update.parent_category_id is not None
+        if moving:
+            # Reject moves under the category's own subtree, not just onto itself
+            await check_move(cursor, category_id, category_update.parent_category_id)
+        
+        # rowcount counts matched rows, so 0 means the category does not exist
+        await cursor.execute(query, update_values)
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Category not found")
+        if moving:
+            await move_category(cursor, category_id, category_update.parent_category_id)
+        await connection.commit()
+        await invalidate_categories()
+        if moving:
+            # Subtree product listings depend on the hierarchy
+            await cache.invalidate_group("products:list")
         
-        cursor.execute("SELECT * FROM categories WHERE category_id = %s", (category_id,))
-        updated_category = cursor.fetchone()
+        await cursor.execute("SELECT * FROM categories WHERE category_id = %s", (category_id,))
+        updated_category = await cursor.fetchone()
         
         return updated_category
         
-    except Error as e:
-        connection.rollback()
+    except DatabaseError as e:
+        await connection.rollback()
+        if e.errno == ER_NO_REFERENCED_ROW:
+            raise HTTPException(status_code=400, detail=f"Parent category with ID {category_update.parent_category_id} does not exist")
         print(f"❌ Database error in update_category: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except CategoryCycle as e:
+        await connection.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     finally:
-        cursor.close()
-        connection.close()
+        await cursor.close()
 
 @app.delete("/categories/{category_id}")
-def delete_category(category_id: int):
-    connection = get_db_connection()
-    cursor = connection.cursor()
+async def delete_category(category_id: int, connection=Depends(get_db)):
+    cursor = await connection.cursor()
     
     try:
-        # Check if category exists
-        cursor.execute("SELECT * FROM categories WHERE category_id = %s", (category_id,))
-        if not cursor.fetchone():
+        await cursor.execute("DELETE FROM categories WHERE category_id = %s", (category_id,))
+        if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Category not found")
-        
-        cursor.execute("DELETE FROM categories WHERE category_id = %s", (category_id,))
-        connection.commit()
+        await connection.commit()
+        await invalidate_categories()
         
         return {"message": "Category deleted successfully"}
         
-    except Error as e:
-        connection.rollback()
+    except DatabaseError as e:
+        await connection.rollback()
+        if e.errno == ER_ROW_IS_REFERENCED:
+            raise HTTPException(status_code=409, detail="Category has products or subcategories and cannot be deleted")
         print(f"❌ Database error in delete_category: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        cursor.close()
-        connection.close()
+        await cursor.close()
+
+# Addresses, cart and checkout
+@app.post("/users/{user_id}/addresses", response_model=AddressResponse, status_code=status.HTTP_201_CREATED)
+async def create_address(user_id: int, address: AddressCreate, connection=Depends(get_db)):
+    cursor = await connection.cursor()
+    
+    try:
+        query = """
+            INSERT INTO addresses (user_id, street_address, city, state, zip_code, country, is_default)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """
+        await cursor.execute(query, (
+            user_id, address.street_address, address.city, address.state,
+            address.zip_code, address.country, address.is_default
+        ))
+        await connection.commit()
+        
+        return {"address_id": cursor.lastrowid, "user_id": user_id, **address.model_dump()}
+        
+    except DatabaseError as e:
+        await connection.rollback()
+        if e.errno == ER_NO_REFERENCED_ROW:
+            raise HTTPException(status_code=404, detail="User not found")
+        print(f"❌ Database error in create_address: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await cursor.close()
+
+@app.get("/users/{user_id}/addresses", response_model=List[AddressResponse])
+async def get_addresses(user_id: int, connection=Depends(get_db)):
+    cursor = await connection.cursor(dictionary=True)
+    
+    try:
+        await cursor.execute("SELECT * FROM addresses WHERE user_id = %s ORDER BY address_id", (user_id,))
+        return await cursor.fetchall()
+        
+    except DatabaseError as e:
+        print(f"❌ Database error in get_addresses: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await cursor.close()
+
+@app.get("/users/{user_id}/cart", response_model=List[CartItemResponse])
+async def get_cart(user_id: int):
+    """The cart from the write-behind store, with names and prices from the product cache."""
+    try:
+        cart = await carts.get(user_id)
+        entries = await cache.get_many_or_load([f"product:{product_id}" for product_id in cart], load_products) if cart else {}
+    except UnknownUser as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DatabaseError as e:
+        print(f"❌ Database error in get_cart: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    items = []
+    for product_id, quantity in cart.items():
+        entry = entries[f"product:{product_id}"]
+        if entry:
+            product = entry["body"]
+            items.append({"product_id": product_id, "name": product["name"], "price": product["price"], "quantity": quantity})
+    return items
+
+@app.put("/users/{user_id}/cart/{product_id}")
+async def set_cart_item(user_id: int, product_id: int, item: CartItemUpdate):
+    key = f"product:{product_id}"
+    try:
+        # Checked up front since the write to cart_items happens after the response
+        if not (await cache.get_many_or_load([key], load_products))[key]:
+            raise HTTPException(status_code=404, detail="Product not found")
+        await carts.set(user_id, product_id, item.quantity)
+    except UnknownUser as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DatabaseError as e:
+        print(f"❌ Database error in set_cart_item: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    return {"user_id": user_id, "product_id": product_id, "quantity": item.quantity}
+
+@app.delete("/users/{user_id}/cart/{product_id}")
+async def delete_cart_item(user_id: int, product_id: int):
+    try:
+        removed = await carts.remove(user_id, product_id)
+    except UnknownUser as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DatabaseError as e:
+        print(f"❌ Database error in delete_cart_item: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if not removed:
+        raise HTTPException(status_code=404, detail="Item not in cart")
+    return {"message": "Item removed from cart"}
+
+@app.post("/users/{user_id}/checkout", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
+async def checkout_cart(user_id: int, request: CheckoutRequest):
+    try:
+        # Checkout reads cart_items, so buffered changes must be written first. The flush
+        # takes its own connection, so it runs before this request checks one out:
+        # holding both would let concurrent checkouts exhaust the pool.
+        await carts.flush(user_id)
+        async with db.connection() as connection:
+            order = await checkout(connection, user_id, request.shipping_address_id, request.payment_method)
+    except OutOfStock as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except CheckoutError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseError as e:
+        print(f"❌ Database error in checkout_cart: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    # The cart was emptied in the database; reload it on next use
+    carts.forget(user_id)
+    # Stock changed, so cached product rows and list pages are stale
+    await invalidate_products(*(item["product_id"] for item in order["items"]))
+    return order
+
+# Sales analytics, read from the rollup tables that rollups.py keeps current
+@app.get("/analytics/revenue", response_model=List[RevenuePoint])
+async def get_revenue(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    interval: str = Query("day", pattern="^(day|hour)$"),
+    category_id: Optional[int] = None,
+    connection=Depends(get_read_db),
+):
+    """Units and revenue per day or hour over ``[start, end)``, cancelled orders excluded."""
+    try:
+        start, end = resolve_range(start, end, interval)
+    except InvalidRange as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cursor = await connection.cursor(dictionary=True)
+
+    try:
+        return await revenue_series(cursor, start, end, interval, category_id)
+    except DatabaseError as e:
+        print(f"❌ Database error in get_revenue: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await cursor.close()
+
+@app.get("/analytics/top-products", response_model=List[ProductSales])
+async def get_top_products(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    by: str = Query("revenue", pattern="^(revenue|units)$"),
+    limit: int = Query(10, ge=1, le=100),
+    category_id: Optional[int] = None,
+    connection=Depends(get_read_db),
+):
+    try:
+        start, end = resolve_range(start, end)
+    except InvalidRange as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cursor = await connection.cursor(dictionary=True)
+
+    try:
+        return await top_products(cursor, start, end, limit, by, category_id)
+    except DatabaseError as e:
+        print(f"❌ Database error in get_top_products: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await cursor.close()
+
+@app.get("/analytics/categories", response_model=List[CategorySales])
+async def get_category_sales(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    connection=Depends(get_read_db),
+):
+    try:
+        start, end = resolve_range(start, end)
+    except InvalidRange as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cursor = await connection.cursor(dictionary=True)
+
+    try:
+        return await category_sales(cursor, start, end)
+    except DatabaseError as e:
+        print(f"❌ Database error in get_category_sales: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await cursor.close()
 
 if __name__ == "__main__":
     import uvicorn
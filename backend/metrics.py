@@ -0,0 +1,133 @@
+import os
+import re
+import time
+from functools import lru_cache
+
+# Instrumentation configuration
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+METRICS_MAX_STATEMENTS = int(os.getenv('METRICS_MAX_STATEMENTS', '500'))
+
+if METRICS_ENABLED:
+    # Imported only when enabled so prometheus_client stays off the startup path otherwise
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+    _LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    HTTP_REQUEST_SECONDS = Histogram(
+        'http_request_duration_seconds', 'HTTP request latency by route template',
+        ['method', 'route', 'status'], buckets=_LATENCY_BUCKETS,
+    )
+    DB_QUERY_SECONDS = Histogram(
+        'db_query_duration_seconds', 'SQL statement latency by normalized statement',
+        ['statement'], buckets=_LATENCY_BUCKETS,
+    )
+    DB_QUERY_ERRORS = Counter('db_query_errors_total', 'SQL statements that raised', ['statement'])
+    DB_ROWS_RETURNED = Counter('db_rows_returned_total', 'Rows fetched by normalized statement', ['statement'])
+    DB_ACQUIRE_SECONDS = Histogram(
+        'db_pool_acquire_duration_seconds', 'Time spent waiting to check out a pooled connection',
+        buckets=_LATENCY_BUCKETS,
+    )
+    DB_SLOW_QUERIES = Counter('db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS', ['statement'])
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_WHEN = re.compile(r"(?:WHEN \? THEN \? ?)+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+_seen_statements = set()
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(query):
+    """Collapses a statement to its shape so variants share one metric label.
+
+    Literals become ``?``, placeholder lists of any length become ``(...)`` and
+    repeated ``CASE`` arms are folded, so ``IN (%s, %s)`` and ``IN (%s)`` match.
+    """
+    sql = _WHITESPACE.sub(" ", query).strip().replace("%s", "?")
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _REPEATED_WHEN.sub("WHEN ? THEN ? ", sql)
+
+
+def _label(query):
+    statement = normalize_sql(query)
+    # Dynamic SQL could otherwise grow the label set without bound
+    if statement not in _seen_statements:
+        if len(_seen_statements) >= METRICS_MAX_STATEMENTS:
+            return "other"
+        _seen_statements.add(statement)
+    return statement
+
+
+def observe_query(query, seconds, failed=False):
+    if not METRICS_ENABLED:
+        return
+    statement = _label(query)
+    DB_QUERY_SECONDS.labels(statement).observe(seconds)
+    if failed:
+        DB_QUERY_ERRORS.labels(statement).inc()
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        DB_SLOW_QUERIES.labels(statement).inc()
+        print(f"🐢 Slow query ({seconds * 1000:.1f} ms): {normalize_sql(query)}")
+
+
+def observe_rows(query, count):
+    if METRICS_ENABLED and query is not None and count:
+        DB_ROWS_RETURNED.labels(_label(query)).inc(count)
+
+
+def observe_acquire(seconds):
+    if METRICS_ENABLED:
+        DB_ACQUIRE_SECONDS.observe(seconds)
+
+
+def register_pool(stats):
+    """Exposes the pool's ``stats()`` counters as gauges read at scrape time."""
+    for key in ('in_use', 'idle', 'waiters'):
+        Gauge(f'db_pool_{key}', f'Connection pool {key.replace("_", " ")}').set_function(
+            lambda key=key: stats()[key]
+        )
+
+
+def render():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template, not per raw path."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route_for(self, scope):
+        if self._routes is None:
+            # Starlette 0.27 leaves the matched endpoint in the scope but not the route
+            self._routes = {
+                getattr(route, "endpoint", None): route.path for route in scope["app"].routes
+            }
+        return self._routes.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(scope["method"], self._route_for(scope), str(status)).observe(
+                time.perf_counter() - started
+            )
@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+
+class InvalidCursor(ValueError):
+    """Raised when an ``after`` token is malformed or was issued for another ordering."""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    elif isinstance(value, (str, int, float)) or value is None:
+        return value
+    # Anything else was not written by _encode_value and would reach the query as is
+    raise ValueError(f"unexpected sort key {value!r}")
+
+
+def encode_cursor(sort, row, sort_column, id_column):
+    """Builds the opaque token pointing just past ``row`` for the given ordering."""
+    payload = {"s": sort, "k": _encode_value(row[sort_column]), "id": row[id_column]}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token, sort):
+    """Returns ``(sort_value, id)`` from a token produced by :func:`encode_cursor`."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        key, last_id = _decode_value(payload["k"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError, ArithmeticError) as e:
+        raise InvalidCursor(f"Invalid pagination cursor: {e}")
+    if payload.get("s") != sort:
+        raise InvalidCursor(f"Cursor was issued for sort '{payload.get('s')}', not '{sort}'")
+    return key, last_id
+
+
+def keyset_condition(sort_column, id_column, key, last_id):
+    """Returns the ``WHERE`` fragment and params selecting rows after ``(key, last_id)``.
+
+    Written as an expanded OR rather than a row comparison so MySQL can use a
+    range scan on the ``(sort_column, id_column)`` index.
+    """
+    if sort_column == id_column:
+        return f"{id_column} > %s", [last_id]
+    return (
+        f"({sort_column} > %s OR ({sort_column} = %s AND {id_column} > %s))",
+        [key, key, last_id],
+    )
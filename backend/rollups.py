@@ -0,0 +1,208 @@
+import asyncio
+import os
+from collections import defaultdict
+
+from database import db
+
+# Sales rollups and category_stats: the triggers queue changes, which are applied in batches
+ROLLUP_DRAIN_ENABLED = os.getenv('ROLLUP_DRAIN_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ROLLUP_DRAIN_INTERVAL = float(os.getenv('ROLLUP_DRAIN_INTERVAL', '1'))
+ROLLUP_DRAIN_BATCH = int(os.getenv('ROLLUP_DRAIN_BATCH', '1000'))
+
+# (table, key column) for each rollup; each queued line is added to all four
+ROLLUPS = (
+    ("sales_product_hourly", "product_id"),
+    ("sales_product_daily", "product_id"),
+    ("sales_category_hourly", "category_id"),
+    ("sales_category_daily", "category_id"),
+)
+
+
+def aggregate(lines, categories):
+    """Sums queued ``(bucket, product_id, units, revenue)`` lines per rollup row.
+
+    Returns ``{table: [(bucket, id, units, revenue), ...]}`` sorted by key,
+    so concurrent drains lock the rollup rows in the same order. Lines for
+    products missing from ``categories`` only count towards the product rollups.
+    """
+    totals = {table: defaultdict(lambda: [0, 0]) for table, _ in ROLLUPS}
+    for bucket, product_id, units, revenue in lines:
+        category_id = categories.get(product_id)
+        for (table, _), key in zip(ROLLUPS, (
+            (bucket, product_id), (bucket.date(), product_id),
+            (bucket, category_id), (bucket.date(), category_id),
+        )):
+            if key[1] is not None:
+                total = totals[table][key]
+                total[0] += units
+                total[1] += revenue
+    return {table: sorted((*key, *total) for key, total in rows.items()) for table, rows in totals.items()}
+
+
+def sum_category_stats(deltas):
+    """Sums queued ``(category_id, products, stock, value)`` deltas per category.
+
+    Returns ``[(products, stock, value, category_id), ...]``, the parameter
+    order of the ``UPDATE``, sorted by category and without categories whose
+    deltas cancel out.
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    for category_id, *delta in deltas:
+        total = totals[category_id]
+        for i, amount in enumerate(delta):
+            total[i] += amount
+    return [(*total, category_id) for category_id, total in sorted(totals.items()) if any(total)]
+
+
+class RollupDrainer:
+    """Adds the order lines queued in ``sales_rollup_queue`` to the sales rollups, after checkout.
+
+    The product deltas queued in ``category_stats_queue`` are applied to
+    ``category_stats`` the same way, in a transaction of their own, so
+    ``GET /stats`` also lags product writes by about ``interval``.
+
+    The triggers in ecommerce_store.sql only append to the queue, so a
+    checkout never locks the rollup rows that every sale in the same hour
+    and category shares. Every ``interval`` seconds the queue is drained in
+    batches of up to ``batch_size`` lines, one transaction each: the lines
+    are claimed with ``SKIP LOCKED``, so several workers can drain at once,
+    summed per rollup row and written with one upsert per table. Analytics
+    therefore lag checkouts by about ``interval``; lines stay queued across
+    restarts and failed drains.
+    """
+
+    def __init__(self, enabled=ROLLUP_DRAIN_ENABLED, interval=ROLLUP_DRAIN_INTERVAL, batch_size=ROLLUP_DRAIN_BATCH):
+        self.enabled = enabled
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+
+        self.batches = 0
+        self.lines = 0
+        self.stats_batches = 0
+        self.stats_deltas = 0
+        self.failures = 0
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # A full batch means more is waiting
+                while await self.drain() == self.batch_size:
+                    pass
+            except Exception as e:
+                # Pool timeouts surface as HTTPException; the lines stay queued for the next round
+                self.failures += 1
+                detail = getattr(e, "detail", None) or str(e)
+                print(f"❌ Draining the rollup queues failed, retrying in {self.interval}s: {detail}")
+
+    async def drain(self):
+        """Applies one batch from each queue, in a transaction each, and returns the larger batch."""
+        lines = await self._in_transaction(self._drain_sales)
+        if lines:
+            self.batches += 1
+            self.lines += lines
+        deltas = await self._in_transaction(self._drain_category_stats)
+        if deltas:
+            self.stats_batches += 1
+            self.stats_deltas += deltas
+        return max(lines, deltas)
+
+    async def _in_transaction(self, drain_once):
+        async with db.connection() as connection:
+            cursor = await connection.cursor()
+            try:
+                count = await drain_once(cursor)
+                await connection.commit()
+            except BaseException:
+                await connection.rollback()
+                raise
+            finally:
+                await cursor.close()
+        return count
+
+    async def _drain_sales(self, cursor):
+        await cursor.execute(
+            "SELECT queue_id, bucket, product_id, units, revenue FROM sales_rollup_queue "
+            "ORDER BY queue_id LIMIT %s FOR UPDATE SKIP LOCKED",
+            (self.batch_size,),
+        )
+        queued = await cursor.fetchall()
+        if not queued:
+            return 0
+
+        # Categories are attributed as of when the line is rolled up
+        product_ids = sorted({row[2] for row in queued})
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        await cursor.execute(
+            f"SELECT product_id, category_id FROM products WHERE product_id IN ({placeholders})",
+            product_ids,
+        )
+        categories = {product_id: category_id for product_id, category_id in await cursor.fetchall()}
+
+        totals = aggregate([row[1:] for row in queued], categories)
+        for table, column in ROLLUPS:
+            rows = totals[table]
+            if rows:
+                await cursor.executemany(
+                    f"INSERT INTO {table} (bucket, {column}, units, revenue) VALUES (%s, %s, %s, %s) "
+                    f"ON DUPLICATE KEY UPDATE units = units + VALUES(units), revenue = revenue + VALUES(revenue)",
+                    rows,
+                )
+        await self._dequeue(cursor, "sales_rollup_queue", queued)
+        return len(queued)
+
+    async def _drain_category_stats(self, cursor):
+        await cursor.execute(
+            "SELECT queue_id, category_id, product_count, stock_quantity, inventory_value FROM category_stats_queue "
+            "ORDER BY queue_id LIMIT %s FOR UPDATE SKIP LOCKED",
+            (self.batch_size,),
+        )
+        queued = await cursor.fetchall()
+        if not queued:
+            return 0
+
+        # An UPDATE rather than an upsert: deltas for a deleted category match no row and are dropped
+        totals = sum_category_stats(row[1:] for row in queued)
+        if totals:
+            await cursor.executemany(
+                "UPDATE category_stats SET product_count = product_count + %s, stock_quantity = stock_quantity + %s, "
+                "inventory_value = inventory_value + %s WHERE category_id = %s",
+                totals,
+            )
+        await self._dequeue(cursor, "category_stats_queue", queued)
+        return len(queued)
+
+    async def _dequeue(self, cursor, table, queued):
+        queue_ids = [row[0] for row in queued]
+        await cursor.execute(
+            f"DELETE FROM {table} WHERE queue_id IN ({', '.join(['%s'] * len(queue_ids))})",
+            queue_ids,
+        )
+
+    async def close(self):
+        # Nothing to flush: undrained lines and deltas are already in the queue tables
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "batches": self.batches,
+            "lines": self.lines,
+            "stats_batches": self.stats_batches,
+            "stats_deltas": self.stats_deltas,
+            "failures": self.failures,
+        }
+
+
+rollups = RollupDrainer()
@@ -0,0 +1,56 @@
+import os
+import re
+
+# Full-text search configuration; keep in step with the server's innodb_ft_min_token_size
+SEARCH_MIN_TOKEN_SIZE = int(os.getenv('SEARCH_MIN_TOKEN_SIZE', '3'))
+SEARCH_MAX_TERMS = int(os.getenv('SEARCH_MAX_TERMS', '8'))
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+MATCH_CLAUSE = "MATCH(name, description) AGAINST (%s IN BOOLEAN MODE)"
+
+
+def build_boolean_query(q, prefix=True):
+    """Turns free text into a BOOLEAN MODE expression requiring every term.
+
+    Operator characters are dropped so user input can never change the query's
+    meaning. With ``prefix`` the last term also matches as a prefix, which is
+    what a typeahead box needs. Returns ``None`` when no term is long enough to
+    be in the index.
+    """
+    tokens = [t for t in _TOKEN.findall(q.lower()) if len(t) >= SEARCH_MIN_TOKEN_SIZE]
+    if not tokens:
+        return None
+    tokens = tokens[:SEARCH_MAX_TERMS]
+    terms = [f"+{t}" for t in tokens]
+    if prefix:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+async def fetch_search_results(cursor, expression, category_id, skip, limit):
+    """Returns ``(rows, facets)`` for a BOOLEAN MODE ``expression``.
+
+    Rows carry a ``score`` column and are ordered by relevance. Facets count
+    matches per category over the whole result set, ignoring ``category_id``,
+    so the client can show how many hits every category would give.
+    """
+    conditions, params = [MATCH_CLAUSE], [expression]
+    if category_id:
+        conditions.append("category_id = %s")
+        params.append(category_id)
+
+    await cursor.execute(
+        f"SELECT *, {MATCH_CLAUSE} AS score FROM products WHERE {' AND '.join(conditions)} "
+        "ORDER BY score DESC, product_id LIMIT %s OFFSET %s",
+        (expression, *params, limit, skip),
+    )
+    rows = await cursor.fetchall()
+
+    await cursor.execute(
+        f"SELECT category_id, COUNT(*) AS count FROM products WHERE {MATCH_CLAUSE} "
+        "GROUP BY category_id ORDER BY count DESC, category_id",
+        (expression,),
+    )
+    facets = await cursor.fetchall()
+    return rows, facets
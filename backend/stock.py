@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+
+from database import db, DatabaseError, ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+
+# Stock update coalescing: requests arriving within the window share one transaction
+STOCK_COALESCE_WINDOW = float(os.getenv('STOCK_COALESCE_WINDOW_MS', '10')) / 1000
+STOCK_MAX_BATCH = int(os.getenv('STOCK_MAX_BATCH', '1000'))
+STOCK_MAX_UPDATES = int(os.getenv('STOCK_MAX_UPDATES', '500'))
+STOCK_MAX_RETRIES = int(os.getenv('STOCK_MAX_RETRIES', '5'))
+STOCK_RETRY_BACKOFF = float(os.getenv('STOCK_RETRY_BACKOFF', '0.01'))
+
+# How long a stored Idempotency-Key response is replayed
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', '86400'))
+IDEMPOTENCY_KEY_MAX_LENGTH = 200
+
+_RETRYABLE = (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT)
+_KEY_SCOPE = "products:stock"
+_PURGE_INTERVAL = 60
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an Idempotency-Key is reused with a different request body."""
+
+
+def request_hash(updates):
+    return hashlib.sha256(json.dumps(updates, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def merge(changes, updates):
+    """Folds ``updates`` into ``changes``, a dict of product_id -> [multiplier, offset, floor].
+
+    The new stock of a product is ``GREATEST(multiplier * stock_quantity +
+    offset, floor)``: an absolute ``quantity`` sets ``(0, quantity, 0)``, a
+    ``delta`` adds to the offset and the floor, and the floor is then raised
+    to 0 again. That gives the same result as clamping each update at zero in
+    arrival order (stock 5, -10, +10 ends at 10, not 5), while any number of
+    updates for one product still collapse into a single ``CASE`` arm.
+    """
+    for update in updates:
+        # Stock is never negative, so a floor of 0 leaves it unchanged
+        change = changes.setdefault(update["product_id"], [1, 0, 0])
+        if update.get("quantity") is not None:
+            change[:] = [0, update["quantity"], 0]
+        else:
+            change[1] += update["delta"]
+            change[2] = max(change[2] + update["delta"], 0)
+    return changes
+
+
+class _Pending:
+    def __init__(self, updates, key):
+        self.updates = updates
+        self.product_ids = list(dict.fromkeys(update["product_id"] for update in updates))
+        self.key = f"{_KEY_SCOPE}:{key}" if key else None
+        self.hash = request_hash(updates)
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class StockCoalescer:
+    """Applies stock updates from concurrent requests in shared transactions.
+
+    Requests submitted within ``window`` seconds of the first pending one are
+    merged and written with one ``UPDATE ... CASE`` and one commit, so a burst
+    of sync calls costs one fsync instead of one per request. A batch is
+    flushed early once it touches ``max_batch`` products.
+    """
+
+    def __init__(self, window=STOCK_COALESCE_WINDOW, max_batch=STOCK_MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._pending_products = 0
+        self._timer = None
+        self._flushes = set()
+        self._last_purge = 0.0
+
+        self.requests = 0
+        self.batches = 0
+        self.replays = 0
+        self.retries = 0
+
+    async def submit(self, updates, idempotency_key=None):
+        """Queues ``updates`` (dicts with product_id and delta or quantity) and waits for their batch.
+
+        Returns ``(result, replayed)`` where ``result`` holds the resulting
+        stock levels and any unknown product IDs. Raises
+        :class:`IdempotencyConflict` or :class:`DatabaseError`.
+        """
+        item = _Pending(updates, idempotency_key)
+        self.requests += 1
+        self._pending.append(item)
+        self._pending_products += len(item.product_ids)
+        if self._pending_products >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_now)
+        # Shielded so a disconnecting client can't cancel a write other requests share
+        return await asyncio.shield(item.future)
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_products = self._pending, [], 0
+        if batch:
+            task = asyncio.ensure_future(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch):
+        self.batches += 1
+        try:
+            async with db.connection() as connection:
+                outcomes = await self._apply(connection, batch)
+                await self._purge_expired(connection)
+        except BaseException as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for item, outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                item.future.set_exception(outcome)
+            else:
+                self.replays += outcome[1]
+                item.future.set_result(outcome)
+
+    async def _apply(self, connection, batch):
+        """Runs the batch as one transaction, retrying it on deadlock or lock wait timeout."""
+        attempt = 0
+        while True:
+            cursor = await connection.cursor(dictionary=True)
+            try:
+                outcomes = await self._apply_once(cursor, batch)
+                await connection.commit()
+                return outcomes
+            except DatabaseError as e:
+                await connection.rollback()
+                if e.errno not in _RETRYABLE or attempt >= STOCK_MAX_RETRIES:
+                    raise
+                attempt += 1
+                self.retries += 1
+                print(f"❌ Stock batch of {len(batch)} requests hit lock error {e.errno}, retry {attempt}/{STOCK_MAX_RETRIES}")
+                await asyncio.sleep(STOCK_RETRY_BACKOFF * (2 ** attempt) * random.random())
+            finally:
+                await cursor.close()
+
+    async def _apply_once(self, cursor, batch):
+        keys = list(dict.fromkeys(item.key for item in batch if item.key))
+        stored = {}
+        if keys:
+            # Locking the keys makes a concurrent batch carrying the same key wait for this one
+            placeholders = ", ".join(["%s"] * len(keys))
+            await cursor.execute(
+                f"SELECT idempotency_key, request_hash, response FROM idempotency_keys "
+                f"WHERE idempotency_key IN ({placeholders}) "
+                f"AND created_at > NOW() - INTERVAL %s SECOND FOR UPDATE",
+                (*keys, IDEMPOTENCY_KEY_TTL),
+            )
+            stored = {row["idempotency_key"]: row for row in await cursor.fetchall()}
+
+        # Decide per request: replay a stored response, reject a reused key, or apply
+        outcomes, applying, first_by_key = [None] * len(batch), [], {}
+        for index, item in enumerate(batch):
+            previous = stored.get(item.key) if item.key else None
+            if previous is None and item.key in first_by_key:
+                previous = {"request_hash": batch[first_by_key[item.key]].hash, "response": None}
+            if previous is None:
+                if item.key:
+                    first_by_key[item.key] = index
+                applying.append(index)
+            elif previous["request_hash"] != item.hash:
+                outcomes[index] = IdempotencyConflict("Idempotency-Key was already used with a different request")
+            elif previous["response"] is not None:
+                outcomes[index] = (json.loads(previous["response"]), True)
+            else:
+                # The same key twice in this batch: the repeat gets the first one's result
+                outcomes[index] = first_by_key[item.key]
+
+        changes = {}
+        for index in applying:
+            merge(changes, batch[index].updates)
+
+        levels = {}
+        if changes:
+            product_ids = sorted(changes)
+            placeholders = ", ".join(["%s"] * len(product_ids))
+            cases = " ".join(["WHEN %s THEN GREATEST(%s * stock_quantity + %s, %s)"] * len(product_ids))
+            case_params = [value for p in product_ids for value in (p, *changes[p])]
+            await cursor.execute(
+                f"UPDATE products SET stock_quantity = CASE product_id {cases} END "
+                f"WHERE product_id IN ({placeholders})",
+                (*case_params, *product_ids),
+            )
+            await cursor.execute(
+                f"SELECT product_id, stock_quantity FROM products WHERE product_id IN ({placeholders})",
+                product_ids,
+            )
+            levels = {row["product_id"]: row["stock_quantity"] for row in await cursor.fetchall()}
+
+        records = []
+        for index in applying:
+            item = batch[index]
+            result = {
+                "updated": [
+                    {"product_id": p, "stock_quantity": levels[p]} for p in item.product_ids if p in levels
+                ],
+                "missing": [p for p in item.product_ids if p not in levels],
+            }
+            outcomes[index] = (result, False)
+            if item.key:
+                records.append((item.key, item.hash, json.dumps(result)))
+
+        if records:
+            # Stored in the same transaction as the stock change, so a retry never applies it twice
+            await cursor.executemany(
+                "INSERT INTO idempotency_keys (idempotency_key, request_hash, response) VALUES (%s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE request_hash = VALUES(request_hash), response = VALUES(response), "
+                "created_at = CURRENT_TIMESTAMP",
+                records,
+            )
+
+        # Repeats within the batch point at the index whose result they share
+        return [
+            (outcomes[outcome][0], True) if isinstance(outcome, int) else outcome
+            for outcome in outcomes
+        ]
+
+    async def _purge_expired(self, connection):
+        if time.monotonic() - self._last_purge < _PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        cursor = await connection.cursor()
+        try:
+            await cursor.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < NOW() - INTERVAL %s SECOND LIMIT 1000",
+                (IDEMPOTENCY_KEY_TTL,),
+            )
+            await connection.commit()
+        except DatabaseError as e:
+            # Expired keys are ignored on lookup anyway, so a failed purge only delays cleanup
+            await connection.rollback()
+            print(f"❌ Purging expired idempotency keys failed: {str(e)}")
+        finally:
+            await cursor.close()
+
+    async def close(self):
+        """Flushes anything still pending and waits for in-flight batches."""
+        self._flush_now()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "replays": self.replays,
+            "retries": self.retries,
+            "pending": len(self._pending),
+        }
+
+
+stock_updates = StockCoalescer()
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+# The API modules import each other flat, as they do when uvicorn runs from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time, so they are fixed before any API module loads
+os.environ.update({
+    "DB_DRIVER": "sync",
+    "DB_REPLICA_URLS": "",
+    "DB_QUERY_COUNT_HEADER": "true",
+    "CACHE_BACKEND": "memory",
+    "METRICS_ENABLED": "false",
+    "WARMUP_ENABLED": "false",
+    "ROLLUP_DRAIN_ENABLED": "false",
+})
+
+from fakedb import FakeDatabase  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Points the API's primary pool at a fresh :class:`FakeDatabase`."""
+    from database import db, ConnectionPool
+
+    fake = FakeDatabase()
+    monkeypatch.setattr(db, "pool", ConnectionPool(fake.connect, size=5, max_overflow=0, timeout=2, pre_ping=False))
+    return fake
+
+
+@pytest.fixture
+def app(fake_db, monkeypatch):
+    """The API with fresh caches, carts and stock batches, and a fast stand-in for bcrypt."""
+    import main
+    import stock
+    from cache import ReadThroughCache
+    from cart import CartStore
+
+    async def fake_hash(password):
+        return f"hashed:{password}"
+
+    monkeypatch.setattr(main, "cache", ReadThroughCache())
+    monkeypatch.setattr(main, "carts", CartStore())
+    monkeypatch.setattr(main, "stock_updates", stock.StockCoalescer())
+    # Keeps the idempotency-key purge from adding a statement to the first stock batch
+    monkeypatch.setattr(stock, "_PURGE_INTERVAL", float("inf"))
+    monkeypatch.setattr(main.hasher, "hash", fake_hash)
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,130 @@
+"""A scriptable stand-in for a mysql-connector connection, for tests without a MySQL server.
+
+Every statement is recorded. Results come from ``(pattern, rows)`` rules
+matched against the statement, the most recently added rule first, so a
+test can override the defaults for the statements it cares about.
+"""
+import re
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+from mysql.connector import errors
+
+NOW = datetime(2024, 1, 1, 12, 0, 0)
+
+USER = {
+    "user_id": 1, "email": "ada@example.com", "first_name": "Ada", "last_name": "Lovelace",
+    "phone_number": None, "created_at": NOW, "updated_at": NOW,
+}
+PRODUCT = {
+    "product_id": 1, "name": "Lamp", "description": None, "price": Decimal("9.99"), "stock_quantity": 5,
+    "category_id": 1, "image_url": None, "created_at": NOW, "updated_at": NOW,
+}
+CATEGORY = {"category_id": 1, "name": "Lighting", "description": None, "parent_category_id": None}
+
+
+def _normalize(query):
+    return " ".join(query.split())
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+        self.connections = 0
+        self._rules = []
+        self._lock = threading.Lock()
+        self._last_id = 100
+        self.on(r"FROM users\b", [USER])
+        self.on(r"FROM products\b", [PRODUCT])
+        self.on(r"FROM categories\b", [CATEGORY])
+        self.on(r"LEFT JOIN cart_items", [{"user_id": 1, "product_id": None, "quantity": None}])
+        self.on(r"FROM cart_items\b", [{"product_id": 1, "quantity": 2}])
+
+    def on(self, pattern, rows=(), rowcount=None, error=None):
+        """Answers statements matching ``pattern`` with ``rows``, or raises ``error`` (an errno).
+
+        ``rows`` may be a callable taking the params, for results that depend on them.
+        """
+        self._rules.insert(0, (re.compile(pattern), rows, rowcount, error))
+
+    def connect(self):
+        with self._lock:
+            self.connections += 1
+        return FakeConnection(self)
+
+    def queries(self, pattern=None):
+        """The recorded statements, optionally only those matching ``pattern``."""
+        return [sql for sql, _ in self.statements if pattern is None or re.search(pattern, sql)]
+
+    def _run(self, query, params):
+        sql = _normalize(query)
+        with self._lock:
+            self.statements.append((sql, params))
+            self._last_id += 1
+            lastrowid = self._last_id
+        for pattern, rows, rowcount, error in self._rules:
+            if pattern.search(sql):
+                if error is not None:
+                    raise errors.IntegrityError(msg=f"fake error {error}", errno=error)
+                rows = [dict(row) for row in (rows(params) if callable(rows) else rows)]
+                break
+        else:
+            rows, rowcount = [], None
+        if rowcount is None:
+            rowcount = len(rows) if sql.startswith("SELECT") else 1
+        return rows, rowcount, lastrowid
+
+
+class FakeCursor:
+    def __init__(self, database, dictionary):
+        self._database = database
+        self._dictionary = dictionary
+        self._rows = []
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, query, params=None):
+        rows, self.rowcount, self.lastrowid = self._database._run(query, params)
+        self._rows = rows if self._dictionary else [tuple(row.values()) for row in rows]
+
+    def executemany(self, query, seq_params):
+        seq_params = list(seq_params)
+        self.execute(query, seq_params)
+        self.rowcount = len(seq_params)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self._database = database
+
+    def cursor(self, dictionary=False, buffered=None):
+        return FakeCursor(self._database, dictionary)
+
+    def commit(self):
+        with self._database._lock:
+            self._database.commits += 1
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from mysql.connector import errors
+
+import bulk_import
+from database import ER_DUP_ENTRY, ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+
+ROWS = [{"name": f"Lamp {i}", "price": 9.99, "stock_quantity": 5, "category_id": 1} for i in range(3)]
+
+
+def ndjson(rows):
+    return "\n".join(json.dumps(row) for row in rows)
+
+
+def fail_then_succeed(*errnos):
+    """Rows for the upsert rule: raises each errno in turn, then succeeds."""
+    pending = list(errnos)
+
+    def rows(params):
+        if pending and pending[0] is not None:
+            raise errors.DatabaseError(msg="fake lock error", errno=pending.pop(0))
+        if pending:
+            pending.pop(0)
+        return []
+    return rows
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(bulk_import, "BULK_RETRY_BACKOFF", 0)
+
+
+@pytest.mark.parametrize("errno", [ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT])
+def test_lock_errors_retry_the_whole_batch(client, fake_db, errno):
+    fake_db.on(r"^INSERT INTO products", fail_then_succeed(errno))
+    report = client.post("/products/bulk", content=ndjson(ROWS)).json()
+    assert (report["written"], report["failed"]) == (3, 0)
+    # Two executemany calls with every row, and no row-by-row replay
+    assert [len(params) for sql, params in fake_db.statements if sql.startswith("INSERT INTO products")] == [3, 3]
+
+
+def test_lock_error_during_the_row_by_row_replay_restarts_the_batch(client, fake_db):
+    # The batch fails on a duplicate, then the replay deadlocks on its second row
+    fake_db.on(r"^INSERT INTO products", fail_then_succeed(ER_DUP_ENTRY, None, ER_LOCK_DEADLOCK))
+    report = client.post("/products/bulk", content=ndjson(ROWS)).json()
+    # The rows written before the deadlock were rolled back with it, so they are not counted twice
+    assert (report["written"], report["failed"]) == (3, 0)
+
+
+def test_lock_errors_give_up_after_the_retries(client, fake_db, monkeypatch):
+    monkeypatch.setattr(bulk_import, "BULK_MAX_RETRIES", 1)
+    fake_db.on(r"^INSERT INTO products", error=ER_LOCK_DEADLOCK)
+    response = client.post("/products/bulk", content=ndjson(ROWS))
+    assert response.status_code == 500
+    assert len(fake_db.queries(r"^INSERT INTO products")) == 2
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from cache import ReadThroughCache, TieredCache
+
+pytestmark = pytest.mark.anyio
+
+
+class SlowLoader:
+    """A loader that blocks until released and counts its calls."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, keys=None):
+        self.calls += 1
+        await self.release.wait()
+        return self.value if keys is None else {key: self.value for key in keys}
+
+
+async def test_concurrent_misses_share_one_load():
+    cache = ReadThroughCache()
+    loader = SlowLoader({"name": "Lamp"})
+    waiting = [asyncio.create_task(cache.get_or_load("product:1", loader)) for _ in range(5)]
+    await asyncio.sleep(0)
+    loader.release.set()
+    assert await asyncio.gather(*waiting) == [{"name": "Lamp"}] * 5
+    assert loader.calls == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+async def test_single_key_reads_join_a_batch_load():
+    cache = ReadThroughCache()
+    loader = SlowLoader({"name": "Lamp"})
+    batch = asyncio.create_task(cache.get_many_or_load(["product:1", "product:2"], loader))
+    await asyncio.sleep(0)
+    single = asyncio.create_task(cache.get_or_load("product:2", loader))
+    await asyncio.sleep(0)
+    loader.release.set()
+    assert (await batch)["product:2"] == await single
+    assert loader.calls == 1
+
+
+async def test_load_overlapping_an_invalidation_is_not_cached():
+    cache = ReadThroughCache()
+    loader = SlowLoader({"name": "old"})
+    load = asyncio.create_task(cache.get_or_load("product:1", loader))
+    await asyncio.sleep(0)
+    await cache.invalidate("product:1")
+    loader.release.set()
+    assert await load == {"name": "old"}
+    assert cache.get("product:1") == (False, None)
+
+
+@pytest.fixture
+def redis_server():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeServer()
+
+
+def tiered(redis_server):
+    import fakeredis
+
+    return TieredCache(client=fakeredis.aioredis.FakeRedis(server=redis_server))
+
+
+async def test_shared_tier_skips_loads_that_overlap_an_invalidation(redis_server):
+    loading, writer = tiered(redis_server), tiered(redis_server)
+    loader = SlowLoader({"name": "old"})
+    load = asyncio.create_task(loading.get_or_load("product:1", loader, group="products"))
+    await asyncio.sleep(0.01)
+    await writer.invalidate("product:1")
+    loader.release.set()
+    await load
+    assert await loading.client.get(loading._key("product:1")) is None
+    assert loading.stats()["l2_stale_writes"] == 1
+
+
+async def test_shared_tier_skips_batch_loads_that_overlap_a_group_invalidation(redis_server):
+    loading, writer = tiered(redis_server), tiered(redis_server)
+    loader = SlowLoader({"name": "old"})
+    load = asyncio.create_task(loading.get_many_or_load(["product:1", "product:2"], loader, group="products"))
+    await asyncio.sleep(0.01)
+    await writer.invalidate_group("products")
+    loader.release.set()
+    await load
+    assert await loading.client.mget([loading._key("product:1"), loading._key("product:2")]) == [None, None]
+
+
+async def test_shared_tier_serves_other_workers(redis_server):
+    first, second = tiered(redis_server), tiered(redis_server)
+
+    async def load():
+        return {"name": "Lamp"}
+
+    async def unreachable():
+        raise AssertionError("should have been served from L2")
+
+    await first.get_or_load("product:1", load)
+    assert await second.get_or_load("product:1", unreachable) == {"name": "Lamp"}
+    assert second.stats()["l2_hits"] == 1
@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+import pytest
+
+from cart import CartStore
+from database import db, ConnectionPool
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_changes_collapse_into_one_batch(fake_db):
+    store = CartStore(interval=60)
+    for user_id in (1, 2):
+        await store.set(user_id, 1, 1)
+        await store.set(user_id, 1, 4)
+        await store.set(user_id, 2, 1)
+        await store.remove(user_id, 2)
+    fake_db.statements.clear()
+    await store.flush()
+
+    upserts = [params for sql, params in fake_db.statements if sql.startswith("INSERT INTO cart_items")]
+    deletes = [params for sql, params in fake_db.statements if sql.startswith("DELETE FROM cart_items")]
+    assert upserts == [[(1, 1, 4), (2, 1, 4)]]
+    assert deletes == [[1, 2, 2, 2]]
+    assert fake_db.commits == 1
+    assert store.stats()["pending_changes"] == 0
+    await store.close()
+
+
+async def test_background_flush_retries_when_no_connection_is_free(fake_db, monkeypatch):
+    monkeypatch.setattr(db, "pool", ConnectionPool(fake_db.connect, size=1, max_overflow=0, timeout=0.05, pre_ping=False))
+    store = CartStore(interval=0.05)
+    await store.set(1, 1, 2)
+
+    # Holding the only connection makes the first flush time out with an HTTPException
+    held = await db.acquire()
+    await asyncio.sleep(0.2)
+    assert store.flushes == 0
+    await db.release(held)
+
+    await asyncio.sleep(0.3)
+    assert store.flushes == 1
+    assert store.stats()["pending_changes"] == 0
+    assert fake_db.queries(r"^INSERT INTO cart_items")
+    await store.close()
+
+
+async def test_concurrent_checkouts_fit_in_a_small_pool(app, fake_db, monkeypatch):
+    import main
+
+    # Each checkout flushes the cart and then takes one connection, never two at once
+    monkeypatch.setattr(db, "pool", ConnectionPool(fake_db.connect, size=2, max_overflow=0, timeout=0.5, pre_ping=False))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        for user_id in range(1, 5):
+            response = await client.put(f"/users/{user_id}/cart/1", json={"quantity": 1})
+            assert response.status_code == 200, response.text
+        responses = await asyncio.gather(*(
+            client.post(f"/users/{user_id}/checkout", json={"shipping_address_id": 1, "payment_method": "card"})
+            for user_id in range(1, 5)
+        ))
+    assert [response.status_code for response in responses] == [201] * 4
+    await main.carts.close()
+
+
+async def test_write_through_reads_changes_made_by_other_workers(fake_db):
+    store = CartStore(write_behind=False)
+    assert await store.get(1) == {}
+
+    # Another worker adds an item; this one must see it without a restart
+    fake_db.on(r"LEFT JOIN cart_items", [
+        {"user_id": 1, "product_id": 1, "quantity": 2},
+        {"user_id": 1, "product_id": 3, "quantity": 1},
+    ])
+    assert await store.get(1) == {1: 2, 3: 1}
+    assert await store.remove(1, 3)
+    assert fake_db.queries(r"^DELETE FROM cart_items")
+    assert store.stats()["carts"] == 0
+    await store.close()
@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.mark.parametrize("params, condition", [
+    ({"category_id": 1}, "WHERE category_id = %s"),
+    ({"category_id": 1, "include_descendants": "true"}, "category_closure WHERE ancestor_id = %s"),
+])
+def test_product_export_filters_match_the_list(client, fake_db, params, condition):
+    response = client.get("/products/export", params=params)
+    assert response.status_code == 200, response.text
+    assert response.text.count('"product_id"') == 1
+    assert condition in fake_db.queries(r"^SELECT .* FROM products")[-1]
@@ -0,0 +1,35 @@
+import base64
+import json
+
+import pytest
+
+from fakedb import PRODUCT, USER
+
+
+def token(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("key", [{"x": 1}, [1], {"dec": "abc"}, {"dt": 5}])
+def test_tampered_cursors_are_rejected(client, fake_db, key):
+    response = client.get("/products/", params={"sort": "price", "paginate": "cursor", "after": token({"s": "price", "k": key, "id": 1})})
+    assert response.status_code == 400, response.text
+    assert not fake_db.queries()
+
+
+@pytest.mark.parametrize("url", ["/users/", "/products/"])
+def test_cursor_mode_needs_a_positive_limit(client, fake_db, url):
+    response = client.get(url, params={"paginate": "cursor", "limit": 0})
+    assert response.status_code == 400, response.text
+    assert not fake_db.queries()
+
+
+def test_cursor_pages_stop_at_the_limit(client, fake_db):
+    fake_db.on(r"FROM users\b", [dict(USER, user_id=user_id) for user_id in (1, 2, 3)])
+    page = client.get("/users/", params={"paginate": "cursor", "limit": 2}).json()
+    assert [user["user_id"] for user in page["items"]] == [1, 2]
+    assert page["next_cursor"]
+
+    fake_db.on(r"FROM products\b", [PRODUCT])
+    page = client.get("/products/", params={"paginate": "cursor", "limit": 1}).json()
+    assert len(page["items"]) == 1 and page["next_cursor"] is None
@@ -0,0 +1,49 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from rollups import RollupDrainer
+
+HOUR = datetime(2024, 1, 1, 10)
+
+
+@pytest.mark.anyio
+async def test_drain_sums_queued_lines_per_rollup_row(fake_db):
+    fake_db.on(r"FROM sales_rollup_queue", [
+        {"queue_id": 1, "bucket": HOUR, "product_id": 1, "units": 2, "revenue": Decimal("20.00")},
+        {"queue_id": 2, "bucket": HOUR, "product_id": 2, "units": 1, "revenue": Decimal("5.00")},
+        {"queue_id": 3, "bucket": HOUR, "product_id": 1, "units": 1, "revenue": Decimal("10.00")},
+    ])
+    fake_db.on(r"^SELECT product_id, category_id FROM products", [
+        {"product_id": 1, "category_id": 7}, {"product_id": 2, "category_id": 7},
+    ])
+
+    assert await RollupDrainer().drain() == 3
+
+    writes = {sql.split()[2]: params for sql, params in fake_db.statements if sql.startswith("INSERT")}
+    assert writes["sales_product_hourly"] == [(HOUR, 1, 3, Decimal("30.00")), (HOUR, 2, 1, Decimal("5.00"))]
+    assert writes["sales_category_daily"] == [(HOUR.date(), 7, 4, Decimal("35.00"))]
+    assert ("DELETE FROM sales_rollup_queue WHERE queue_id IN (%s, %s, %s)", [1, 2, 3]) in fake_db.statements
+    # One transaction per queue, even when the category_stats queue is empty
+    assert fake_db.commits == 2
+
+
+@pytest.mark.anyio
+async def test_drain_applies_category_stats_deltas_per_category(fake_db):
+    fake_db.on(r"FROM category_stats_queue", [
+        # A product moved from category 7 to 3, then a stock change in 7 and one that cancels it
+        {"queue_id": 1, "category_id": 7, "product_count": -1, "stock_quantity": -5, "inventory_value": Decimal("-50.00")},
+        {"queue_id": 2, "category_id": 3, "product_count": 1, "stock_quantity": 5, "inventory_value": Decimal("50.00")},
+        {"queue_id": 3, "category_id": 7, "product_count": 0, "stock_quantity": 2, "inventory_value": Decimal("4.00")},
+        {"queue_id": 4, "category_id": 4, "product_count": 0, "stock_quantity": 1, "inventory_value": Decimal("2.00")},
+        {"queue_id": 5, "category_id": 4, "product_count": 0, "stock_quantity": -1, "inventory_value": Decimal("-2.00")},
+    ])
+
+    drainer = RollupDrainer()
+    assert await drainer.drain() == 5
+
+    updates = [params for sql, params in fake_db.statements if sql.startswith("UPDATE category_stats")]
+    assert updates == [[(1, 5, Decimal("50.00"), 3), (-1, -3, Decimal("-46.00"), 7)]]
+    assert fake_db.statements[-1] == ("DELETE FROM category_stats_queue WHERE queue_id IN (%s, %s, %s, %s, %s)", [1, 2, 3, 4, 5])
+    assert drainer.stats()["stats_deltas"] == 5
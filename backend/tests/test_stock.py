@@ -0,0 +1,49 @@
+import asyncio
+import itertools
+
+import pytest
+
+import stock
+from stock import StockCoalescer, merge
+
+
+def apply_in_order(level, updates):
+    for update in updates:
+        level = max(update["quantity"] if update.get("quantity") is not None else level + update["delta"], 0)
+    return level
+
+
+def apply_merged(level, updates):
+    multiplier, offset, floor = merge({}, updates)[1]
+    return max(multiplier * level + offset, floor)
+
+
+def test_merge_clamps_each_update_at_zero():
+    updates = [{"product_id": 1, "delta": -10}, {"product_id": 1, "delta": 10}]
+    assert apply_merged(5, updates) == apply_in_order(5, updates) == 10
+
+
+@pytest.mark.parametrize("updates", [
+    [{"product_id": 1, "delta": d} if d is not None else {"product_id": 1, "quantity": q} for d, q in combo]
+    for combo in itertools.product([(-7, None), (3, None), (None, 2), (-1, None)], repeat=3)
+])
+@pytest.mark.parametrize("level", [0, 1, 6])
+def test_merge_matches_applying_updates_in_order(level, updates):
+    assert apply_merged(level, updates) == apply_in_order(level, updates)
+
+
+@pytest.mark.anyio
+async def test_concurrent_requests_share_one_update(fake_db, monkeypatch):
+    monkeypatch.setattr(stock, "_PURGE_INTERVAL", float("inf"))
+    fake_db.on(r"^SELECT product_id, stock_quantity FROM products", [{"product_id": 1, "stock_quantity": 4}])
+    coalescer = StockCoalescer(window=0.01)
+    results = await asyncio.gather(
+        coalescer.submit([{"product_id": 1, "delta": -1}]),
+        coalescer.submit([{"product_id": 1, "quantity": 5}]),
+    )
+    assert [result["updated"] for result, _ in results] == [[{"product_id": 1, "stock_quantity": 4}]] * 2
+    assert len(fake_db.queries(r"^UPDATE products")) == 1
+    assert fake_db.commits == 1
+    _, params = [entry for entry in fake_db.statements if entry[0].startswith("UPDATE")][0]
+    # product 1: multiplier 0, offset 5, floor 0 once the absolute quantity wins
+    assert params[:4] == (1, 0, 5, 0)
@@ -0,0 +1,76 @@
+"""Round-trips per write endpoint, as reported in X-DB-Queries."""
+import pytest
+
+from database import ER_DUP_ENTRY, ER_NO_REFERENCED_ROW, ER_ROW_IS_REFERENCED
+
+USER = {"email": "ada@example.com", "password": "secret", "first_name": "Ada", "last_name": "Lovelace"}
+PRODUCT = {"name": "Lamp", "price": 9.99, "stock_quantity": 5, "category_id": 1}
+ADDRESS = {"street_address": "1 Main St", "city": "Springfield", "state": "IL", "zip_code": "62701", "country": "US"}
+
+
+def queries(response):
+    return int(response.headers["x-db-queries"])
+
+
+@pytest.mark.parametrize("method, url, body, status, expected", [
+    ("post", "/users/", USER, 201, 3),
+    ("put", "/users/1", {"first_name": "Augusta"}, 200, 3),
+    ("delete", "/users/1", None, 200, 2),
+    ("post", "/products/", PRODUCT, 201, 3),
+    ("put", "/products/1", {"price": 12.5}, 200, 3),
+    ("delete", "/products/1", None, 200, 2),
+    ("post", "/categories/", {"name": "Lighting"}, 201, 3),
+    ("put", "/categories/1", {"name": "Lamps"}, 200, 3),
+    ("delete", "/categories/1", None, 200, 2),
+    ("post", "/users/1/addresses", ADDRESS, 201, 2),
+    ("patch", "/products/stock", {"updates": [{"product_id": 1, "delta": -1}]}, 200, 3),
+])
+def test_write_round_trips(client, fake_db, method, url, body, status, expected):
+    response = client.request(method, url, json=body)
+    assert response.status_code == status, response.text
+    assert queries(response) == expected, fake_db.queries()
+
+
+def test_updates_check_existence_with_the_row_count(client, fake_db):
+    fake_db.on(r"^UPDATE products", rowcount=0)
+    response = client.put("/products/9", json={"price": 1})
+    assert response.status_code == 404
+    assert queries(response) == 1
+
+
+def test_deletes_check_existence_with_the_row_count(client, fake_db):
+    fake_db.on(r"^DELETE FROM users", rowcount=0)
+    response = client.delete("/users/9")
+    assert response.status_code == 404
+    assert queries(response) == 1
+
+
+@pytest.mark.parametrize("method, url, body, pattern, errno, status", [
+    ("post", "/users/", USER, r"^INSERT INTO users", ER_DUP_ENTRY, 400),
+    ("post", "/products/", PRODUCT, r"^INSERT INTO products", ER_NO_REFERENCED_ROW, 400),
+    ("delete", "/products/1", None, r"^DELETE FROM products", ER_ROW_IS_REFERENCED, 409),
+    ("post", "/users/9/addresses", ADDRESS, r"^INSERT INTO addresses", ER_NO_REFERENCED_ROW, 404),
+])
+def test_constraint_errors_replace_lookups(client, fake_db, method, url, body, pattern, errno, status):
+    fake_db.on(pattern, error=errno)
+    response = client.request(method, url, json=body)
+    assert response.status_code == status, response.text
+    # The failed statement and the rollback
+    assert queries(response) == 2
+
+
+def test_cart_changes_are_written_behind(client, fake_db):
+    # The first change loads the product and the cart; later ones touch neither
+    assert queries(client.put("/users/1/cart/1", json={"quantity": 1})) == 2
+    assert queries(client.put("/users/1/cart/1", json={"quantity": 3})) == 0
+    assert queries(client.delete("/users/1/cart/1")) == 0
+    assert not fake_db.queries(r"cart_items \(user_id")
+
+
+def test_checkout_flushes_the_cart_then_runs_one_transaction(client, fake_db):
+    client.put("/users/1/cart/1", json={"quantity": 2})
+    response = client.post("/users/1/checkout", json={"shipping_address_id": 1, "payment_method": "card"})
+    assert response.status_code == 201, response.text
+    # The buffered change and its commit, then seven statements and a commit for the order itself
+    assert queries(response) == 10
+    assert fake_db.queries()[-8].startswith("INSERT INTO cart_items")
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+
+from database import DB_POOL_SIZE
+
+# Startup warm-up: readiness is reported only once it has finished
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', '60'))
+WARMUP_DB_CONNECTIONS = int(os.getenv('WARMUP_DB_CONNECTIONS', str(DB_POOL_SIZE)))
+WARMUP_HOT_PRODUCTS = int(os.getenv('WARMUP_HOT_PRODUCTS', '100'))
+WARMUP_HOT_DAYS = int(os.getenv('WARMUP_HOT_DAYS', '7'))
+# Longest a readiness probe waits for the database
+READINESS_TIMEOUT = float(os.getenv('READINESS_TIMEOUT', '2'))
+
+
+class Warmup:
+    """Runs the startup warm-up steps in the background and records how each went.
+
+    The server accepts connections straight away, so liveness probes pass,
+    while :attr:`ready` stays false until every step has finished, failed or
+    run past ``timeout``. A failed step is logged and skipped; the first
+    requests then pay for it as they would without a warm-up.
+    """
+
+    def __init__(self, timeout=WARMUP_TIMEOUT):
+        self.timeout = timeout
+        self.ready = False
+        self.steps = {}
+        self.seconds = None
+        self._task = None
+
+    def start(self, steps):
+        """Runs ``steps``, ``(name, coroutine function)`` pairs, one after another in a background task."""
+        self._task = asyncio.create_task(self._run(steps))
+
+    async def _run(self, steps):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._run_steps(steps), self.timeout)
+        except asyncio.TimeoutError:
+            print(f"❌ Warm-up did not finish within {self.timeout}s, serving anyway")
+        self.seconds = round(time.perf_counter() - started, 3)
+        self.ready = True
+        if steps:
+            print(f"✅ Warm-up finished in {self.seconds}s")
+
+    async def _run_steps(self, steps):
+        for name, step in steps:
+            started = time.perf_counter()
+            self.steps[name] = {"status": "running"}
+            try:
+                result = await step()
+            except Exception as e:
+                self.steps[name] = {"status": "failed", "error": str(e)}
+                print(f"❌ Warm-up step {name} failed: {str(e)}")
+            else:
+                self.steps[name] = {"status": "done", "result": result}
+            self.steps[name]["seconds"] = round(time.perf_counter() - started, 3)
+
+    async def close(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self):
+        return {"ready": self.ready, "seconds": self.seconds, "steps": self.steps}
+
+
+warmup = Warmup()
@@ -7,6 +7,11 @@ import {
   CardContent,
   Box,
   LinearProgress,
+  Table,
+  TableBody,
+  TableCell,
+  TableHead,
+  TableRow,
 } from '@mui/material';
 import {
   People as PeopleIcon,
@@ -14,7 +19,7 @@ import {
   Category as CategoryIcon,
   AttachMoney as MoneyIcon,
 } from '@mui/icons-material';
-import { usersAPI, productsAPI, categoriesAPI } from '../services/api';
+import { statsAPI } from '../services/api';
 
 const Dashboard = () => {
   const [stats, setStats] = useState({
@@ -22,29 +27,23 @@ const Dashboard = () => {
     products: 0,
     categories: 0,
     totalValue: 0,
+    byCategory: [],
     loading: true,
   });
 
   useEffect(() => {
     const fetchStats = async () => {
       try {
-        const [usersResponse, productsResponse, categoriesResponse] = await Promise.all([
-          usersAPI.getAll(),
-          productsAPI.getAll(),
-          categoriesAPI.getAll(),
-        ]);
-
-        const users = usersResponse.data;
-        const products = productsResponse.data;
-        const categories = categoriesResponse.data;
-
-        const totalValue = products.reduce((sum, product) => sum + (product.price * product.stock_quantity), 0);
+        // Totals are aggregated server-side from precomputed summary tables
+        const response = await statsAPI.get();
+        const data = response.data;
 
         setStats({
-          users: users.length,
-          products: products.length,
-          categories: categories.length,
-          totalValue: totalValue,
+          users: data.users,
+          products: data.products,
+          categories: data.categories,
+          totalValue: data.inventory_value,
+          byCategory: data.by_category,
           loading: false,
         });
       } catch (err) {
@@ -141,6 +140,34 @@ const Dashboard = () => {
         </Grid>
       </Grid>
 
+      <Box mt={4}>
+        <Typography variant="h5" gutterBottom>
+          Inventory by Category
+        </Typography>
+        <Card>
+          <Table size="small">
+            <TableHead>
+              <TableRow>
+                <TableCell>Category</TableCell>
+                <TableCell align="right">Products</TableCell>
+                <TableCell align="right">Units in Stock</TableCell>
+                <TableCell align="right">Inventory Value</TableCell>
+              </TableRow>
+            </TableHead>
+            <TableBody>
+              {stats.byCategory.map((category) => (
+                <TableRow key={category.category_id}>
+                  <TableCell>{category.name}</TableCell>
+                  <TableCell align="right">{category.products}</TableCell>
+                  <TableCell align="right">{category.stock_quantity}</TableCell>
+                  <TableCell align="right">${category.inventory_value.toFixed(2)}</TableCell>
+                </TableRow>
+              ))}
+            </TableBody>
+          </Table>
+        </Card>
+      </Box>
+
       <Box mt={4}>
         <Typography variant="h5" gutterBottom>
           Quick Overview
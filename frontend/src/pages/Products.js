@@ -17,6 +17,7 @@ import {
   Box,
   Alert,
   Chip,
+  TextField,
 } from '@mui/material';
 import {
   Add as AddIcon,
@@ -33,6 +34,9 @@ const Products = () => {
   const [editingProduct, setEditingProduct] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  const [query, setQuery] = useState('');
+  const [searchCategory, setSearchCategory] = useState(null);
+  const [searchResult, setSearchResult] = useState(null);
 
   const fetchData = async () => {
     try {
@@ -56,6 +60,24 @@ const Products = () => {
     fetchData();
   }, []);
 
+  useEffect(() => {
+    if (!query.trim()) {
+      setSearchResult(null);
+      return undefined;
+    }
+    // Debounce keystrokes so typeahead sends one request per pause
+    const timer = setTimeout(async () => {
+      try {
+        const params = searchCategory ? { category_id: searchCategory, limit: 50 } : { limit: 50 };
+        const response = await productsAPI.search(query, params);
+        setSearchResult(response.data);
+      } catch (err) {
+        console.error('Error searching products:', err);
+      }
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [query, searchCategory]);
+
   const handleCreate = () => {
     setEditingProduct(null);
     setOpen(true);
@@ -132,6 +154,36 @@ const Products = () => {
         </Alert>
       )}
 
+      <TextField
+        fullWidth
+        label="Search products"
+        value={query}
+        onChange={(e) => {
+          setQuery(e.target.value);
+          setSearchCategory(null);
+        }}
+        sx={{ mb: 2 }}
+      />
+
+      {searchResult && (
+        <Box display="flex" flexWrap="wrap" gap={1} mb={2}>
+          <Typography variant="body2" color="textSecondary" sx={{ mr: 1, alignSelf: 'center' }}>
+            {searchResult.total} results
+          </Typography>
+          {searchResult.facets.map((facet) => (
+            <Chip
+              key={facet.category_id}
+              label={`${getCategoryName(facet.category_id)} (${facet.count})`}
+              color={searchCategory === facet.category_id ? 'primary' : 'default'}
+              onClick={() => setSearchCategory(
+                searchCategory === facet.category_id ? null : facet.category_id
+              )}
+              size="small"
+            />
+          ))}
+        </Box>
+      )}
+
       <TableContainer component={Paper}>
         <Table>
           <TableHead>
@@ -146,7 +198,7 @@ const Products = () => {
             </TableRow>
           </TableHead>
           <TableBody>
-            {products.map((product) => (
+            {(searchResult ? searchResult.items : products).map((product) => (
               <TableRow key={product.product_id}>
                 <TableCell>{product.product_id}</TableCell>
                 <TableCell>
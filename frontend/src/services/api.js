@@ -5,6 +5,8 @@ const API_BASE_URL = 'http://localhost:8000';
 // First create the axios instance
 const api = axios.create({
   baseURL: API_BASE_URL,
+  // Sends the read-your-writes cookie back so reads after a write skip lagging replicas
+  withCredentials: true,
   headers: {
     'Content-Type': 'application/json',
   },
@@ -28,6 +30,7 @@ api.interceptors.response.use(
 export const usersAPI = {
   getAll: () => api.get('/users/'),
   getById: (id) => api.get(`/users/${id}`),
+  getByIds: (ids) => api.post('/users/batch', { ids }),
   create: (userData) => api.post('/users/', userData),
   update: (id, userData) => api.put(`/users/${id}`, userData),
   delete: (id) => api.delete(`/users/${id}`),
@@ -35,8 +38,10 @@ export const usersAPI = {
 
 // Products API
 export const productsAPI = {
-  getAll: () => api.get('/products/'),
+  getAll: (params = {}) => api.get('/products/', { params }),
   getById: (id) => api.get(`/products/${id}`),
+  getByIds: (ids) => api.get('/products/batch', { params: { ids: ids.join(',') } }),
+  search: (q, params = {}) => api.get('/products/search', { params: { q, ...params } }),
   create: (productData) => api.post('/products/', productData),
   update: (id, productData) => api.put(`/products/${id}`, productData),
   delete: (id) => api.delete(`/products/${id}`),
@@ -45,7 +50,20 @@ export const productsAPI = {
 // Categories API
 export const categoriesAPI = {
   getAll: () => api.get('/categories/'),
+  getAncestors: (id) => api.get(`/categories/${id}/ancestors`),
   create: (categoryData) => api.post('/categories/', categoryData),
 };
 
+// Stats API
+export const statsAPI = {
+  get: () => api.get('/stats'),
+};
+
+// Analytics API (params: start, end as ISO dates or datetimes)
+export const analyticsAPI = {
+  revenue: (params = {}) => api.get('/analytics/revenue', { params }),
+  topProducts: (params = {}) => api.get('/analytics/top-products', { params }),
+  categories: (params = {}) => api.get('/analytics/categories', { params }),
+};
+
 export default api;
\ No newline at end of file